@@ -4,38 +4,73 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 
+from config import Config, configs
+import database
+
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': database.RoutingSession})
 login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+
+def create_app(config=None):
+    """Build a configured app.
+
+    ``config`` is a name from ``config.configs``, a config class, or a mapping
+    of overrides on top of the base config; it defaults to the ``APP_CONFIG``
+    environment variable. The database schema is left alone unless
+    ``AUTO_MIGRATE`` is set.
+    """
+    app = Flask(__name__)
+    config = config or os.environ.get("APP_CONFIG", "production")
+    if isinstance(config, str):
+        app.config.from_object(configs[config])
+    elif isinstance(config, dict):
+        app.config.from_object(Config)
+        app.config.update(config)
+    else:
+        app.config.from_object(config)
+
+    # initialize the app with the extensions
+    database.configure(app)
+    db.init_app(app)
+    database.init_app(app)
+    login_manager.init_app(app)
+    from jobs import job_queue
+    job_queue.init_app(app)
+
+    # Views and models are only imported once an app is actually built, so
+    # importing this module stays cheap and free of side effects.
+    import models  # noqa: F401  registers the models and the user loader
+    from routes import bp
+    app.register_blueprint(bp)
+
+    from inventory import inventory_cli
+    from transfer import data_cli
+    from jobs import jobs_cli
+    from scheduling import schedules_cli
+    from rollups import rollups_cli
+    from units import units_cli
+    from migrations import upgrade, upgrade_db_command, schema_version_command
+    from seed import seed_command
+    app.cli.add_command(inventory_cli)
+    app.cli.add_command(data_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(schedules_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(units_cli)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(schema_version_command)
+    app.cli.add_command(seed_command)
+
+    import pages
+    pages.init_app(app)
+
+    from instrumentation import instrumentation
+    instrumentation.init_app(app)
 
-# create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "your-secret-key")
-
-# configure SQLite database
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///blood_donation.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# initialize the app with the extensions
-db.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = 'login'
-
-def init_blood_inventory():
-    from models import BloodInventory
-    blood_types = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
-    for blood_type in blood_types:
-        if not BloodInventory.query.filter_by(blood_type=blood_type).first():
-            inventory = BloodInventory(blood_type=blood_type, quantity_ml=0)
-            db.session.add(inventory)
-    db.session.commit()
-
-with app.app_context():
-    # Import routes after the app is created to avoid circular imports
-    from routes import *
-    # Create all database tables
-    db.drop_all()  # Drop existing tables
-    db.create_all()  # Create new tables with updated schema
-    init_blood_inventory()  # Initialize blood inventory
\ No newline at end of file
+    if app.config.get("AUTO_MIGRATE"):
+        with app.app_context():
+            upgrade()
+    return app
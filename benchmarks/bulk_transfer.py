@@ -0,0 +1,81 @@
+"""Bulk import/export throughput and memory benchmark.
+
+Usage: python benchmarks/bulk_transfer.py [rows]
+
+Imports ``rows`` donor profiles from a generated CSV file and exports them
+again, reporting rows/s for both directions. Peak traced memory is measured
+at two sizes; it should stay flat as the row count grows.
+"""
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, DonorProfile
+from transfer import export_csv, import_rows, read_csv
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+PLACES = [('Boston', 'MA', '02108'), ('New York', 'NY', '10001'), ('Chicago', 'IL', '60601'),
+          ('Seattle', 'WA', '98101'), ('Springfield', 'IL', '62701')]
+
+def write_csv(path, count, rng):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['user_id', 'blood_type', 'last_donation', 'address', 'city', 'state', 'zip_code'])
+        for i in range(1, count + 1):
+            city, state, zip_code = rng.choice(PLACES)
+            last = f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}' if rng.random() < 0.6 else ''
+            writer.writerow([i, rng.choice(BLOOD_TYPES), last, f'{i} Main St', city, state, zip_code])
+
+def run(count, trace):
+    app = create_app('testing')
+    rng = random.Random(11)
+    path = os.path.join(tempfile.mkdtemp(), 'donors.csv')
+    write_csv(path, count, rng)
+    with app.app_context():
+        db.session.execute(db.insert(User), [
+            {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'role': 'donor'}
+            for i in range(1, count + 1)
+        ])
+        db.session.commit()
+
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with open(path, newline='') as f:
+            result = import_rows('donors', read_csv(f))
+        imported = time.perf_counter() - start
+        import_peak = tracemalloc.get_traced_memory()[1] if trace else 0
+
+        if trace:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        written = sum(len(chunk) for chunk in export_csv('donors'))
+        exported = time.perf_counter() - start
+        export_peak = tracemalloc.get_traced_memory()[1] if trace else 0
+        if trace:
+            tracemalloc.stop()
+
+        assert result.imported == count == DonorProfile.query.count(), result.as_dict()
+        db.session.remove()
+        db.drop_all(bind_key=None)
+    return imported, exported, written, import_peak, export_peak
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    imported, exported, written, _, _ = run(rows, trace=False)
+    print(f"rows={rows}")
+    print(f"import: {imported:.2f}s  {rows / imported:,.0f} rows/s")
+    print(f"export: {exported:.2f}s  {rows / exported:,.0f} rows/s  ({written / 1e6:.1f} MB)")
+    for size in (rows // 10, rows):
+        _, _, _, import_peak, export_peak = run(size, trace=True)
+        print(f"peak memory at {size:>8} rows: import {import_peak / 1e6:.1f} MB, export {export_peak / 1e6:.1f} MB")
+
+if __name__ == '__main__':
+    main()
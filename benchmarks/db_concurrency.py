@@ -0,0 +1,107 @@
+"""SQLite read/write concurrency benchmark, before and after the engine tuning.
+
+Usage: python benchmarks/db_concurrency.py [readers] [writers] [seconds] [users]
+
+Seeds a SQLite file, then runs reader and writer processes against a copy
+of it, as gunicorn workers would: readers run the donor search and dashboard
+queries, writers adjust inventory. Each copy is run twice, once with the old
+defaults (rollback journal, full sync, busy timeout only from the driver)
+and once with the settings from config.py (WAL and friends). Reports reads/s,
+writes/s and how many operations failed with "database is locked".
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from matching import BLOOD_TYPES
+
+# What the app ran with before database.py existed.
+BEFORE = {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_CACHE_SIZE_KB': 2000,
+          'SQLITE_MMAP_SIZE_MB': 0}
+AFTER = {}
+CITIES = ['Boston', 'Chicago', 'Denver', 'Seattle', 'Miami']
+
+def make_app(path, settings):
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'PASSWORD_HASH_WORKERS': 0,
+                       'JOBS_WORKERS': 0, **settings})
+
+def read(rng):
+    from models import BloodRequest, DonorProfile
+    DonorProfile.query.filter_by(blood_type=rng.choice(BLOOD_TYPES), city=rng.choice(CITIES)).limit(20).all()
+    db.session.query(BloodRequest.status, db.func.count()).group_by(BloodRequest.status).all()
+
+def write(rng):
+    from inventory import InsufficientInventory, adjust_inventory
+    try:
+        adjust_inventory(rng.choice(BLOOD_TYPES), rng.choice([450, -450]), 'benchmark')
+    except InsufficientInventory:
+        pass
+
+def worker(path, settings, role, seconds, seed, results):
+    app = make_app(path, settings)
+    rng = random.Random(seed)
+    operation = read if role == 'read' else write
+    done = locked = 0
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            try:
+                operation(rng)
+                db.session.rollback()
+                done += 1
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e):
+                    raise
+                locked += 1
+    results.put((role, done, locked))
+
+def run(path, settings, readers, writers, seconds):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(path, settings, role, seconds, i, results))
+                 for i, role in enumerate(['read'] * readers + ['write'] * writers)]
+    for process in processes:
+        process.start()
+    totals = {'read': [0, 0], 'write': [0, 0]}
+    for _ in processes:
+        role, done, locked = results.get()
+        totals[role][0] += done
+        totals[role][1] += locked
+    for process in processes:
+        process.join()
+    return totals
+
+def main():
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    users = int(sys.argv[4]) if len(sys.argv) > 4 else 20000
+    directory = tempfile.mkdtemp()
+    seeded = os.path.join(directory, 'seeded.db')
+    app = make_app(seeded, {'AUTO_MIGRATE': True, **BEFORE})
+    with app.app_context():
+        from seed import generate
+        generate(users)
+        db.engine.dispose()
+
+    print(f'{readers} readers, {writers} writers, {seconds:.0f}s each, {users} users')
+    print(f"{'mode':8} {'reads/s':>9} {'writes/s':>9} {'locked':>7}")
+    for name, settings in (('before', BEFORE), ('after', AFTER)):
+        path = os.path.join(directory, f'{name}.db')
+        shutil.copy(seeded, path)
+        totals = run(path, settings, readers, writers, seconds)
+        print(f"{name:8} {totals['read'][0] / seconds:9.0f} {totals['write'][0] / seconds:9.0f} "
+              f"{totals['read'][1] + totals['write'][1]:7}")
+
+if __name__ == '__main__':
+    main()
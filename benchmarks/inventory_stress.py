@@ -0,0 +1,80 @@
+"""Concurrent inventory stress test: no lost updates, no negative stock.
+
+Usage: python benchmarks/inventory_stress.py [threads] [operations_per_thread]
+
+Worker threads hammer adjust_inventory with random adds and removals on a
+temporary SQLite file. Exits non-zero if any balance differs from the sum of
+the adjustments that reported success, goes negative, or disagrees with the
+ledger.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import BloodInventory
+from inventory import InsufficientInventory, adjust_inventory, verify_inventory
+
+app = create_app({
+    'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.db')}",
+    'AUTO_MIGRATE': True,
+})
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+def worker(seed, operations, applied, rejected, lock):
+    rng = random.Random(seed)
+    local_applied, local_rejected = Counter(), 0
+    with app.app_context():
+        for _ in range(operations):
+            # Bias towards a few hot types so workers really contend.
+            blood_type = rng.choice(BLOOD_TYPES[:3] if rng.random() < 0.8 else BLOOD_TYPES)
+            delta = rng.choice([450, 900]) * (1 if rng.random() < 0.55 else -1)
+            try:
+                adjust_inventory(blood_type, delta, 'stress')
+                local_applied[blood_type] += delta
+            except InsufficientInventory:
+                local_rejected += 1
+    with lock:
+        applied.update(local_applied)
+        rejected[0] += local_rejected
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    applied, rejected, lock = Counter(), [0], threading.Lock()
+    pool = [threading.Thread(target=worker, args=(seed, operations, applied, rejected, lock))
+            for seed in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    failures = []
+    with app.app_context():
+        for item in BloodInventory.query.all():
+            if item.quantity_ml != applied[item.blood_type]:
+                failures.append(f'{item.blood_type}: stored {item.quantity_ml}ml, expected {applied[item.blood_type]}ml')
+            if item.quantity_ml < 0:
+                failures.append(f'{item.blood_type}: negative balance {item.quantity_ml}ml')
+        for blood_type, (stored, replayed) in verify_inventory().items():
+            failures.append(f'{blood_type}: stored {stored}ml, ledger {replayed}ml')
+
+    total = threads * operations
+    print(f"threads={threads} operations={total} rejected={rejected[0]} "
+          f"elapsed={elapsed:.2f}s throughput={total / elapsed:.0f} ops/s")
+    if failures:
+        print('FAILED\n' + '\n'.join(failures))
+        sys.exit(1)
+    print('OK: no lost updates, no negative stock, ledger consistent')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Emergency fan-out benchmark.
+
+Usage: python benchmarks/job_fanout.py [donors]
+
+Submits an emergency blood request through the web form on a file-backed
+SQLite database with ``donors`` compatible donors, then reports how long the
+HTTP response took and how long the background job needed to alert every
+donor. The response time should not grow with the number of donors.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from jobs import job_queue
+from models import User, DonorProfile, Job, Notification
+
+def populate(count):
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'role': 'donor'}
+        for i in range(1, count + 1)
+    ])
+    db.session.execute(db.insert(DonorProfile), [
+        {'user_id': i, 'blood_type': 'O-', 'availability_status': 'available'} for i in range(1, count + 1)
+    ])
+    recipient = User(username='recipient', email='recipient@example.com', role='recipient')
+    recipient.set_password('secret1')
+    db.session.add(recipient)
+    db.session.commit()
+
+def main():
+    donors = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    path = os.path.join(tempfile.mkdtemp(), 'fanout.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'AUTO_MIGRATE': True,
+                      'WTF_CSRF_ENABLED': False})
+    client = app.test_client()
+    with app.app_context():
+        populate(donors)
+    client.post('/login', data={'email': 'recipient@example.com', 'password': 'secret1'})
+
+    start = time.perf_counter()
+    response = client.post('/recipient/request_blood', data={
+        'blood_type': 'A+', 'quantity_ml': 450, 'hospital_name': 'General', 'contact_number': '555-0100',
+        'emergency': 'y'})
+    responded = time.perf_counter() - start
+    assert response.status_code == 302, response.status_code
+
+    with app.app_context():
+        while db.session.query(Job).filter(Job.kind == 'emergency_fanout',
+                                           Job.status.in_(('queued', 'running'))).count():
+            db.session.rollback()
+            time.sleep(0.02)
+        finished = time.perf_counter() - start
+        notified = Notification.query.count()
+        stats = job_queue.stats()
+    job_queue.stop()
+
+    assert notified == donors, (notified, donors)
+    print(f"donors={donors}")
+    print(f"HTTP response: {responded * 1000:.1f} ms")
+    print(f"all donors notified after {finished:.2f}s ({donors / finished:,.0f} notifications/s)")
+    print(f"queue latency p50 {stats['queue_latency_p50'] * 1000:.1f} ms, job run time p50 {stats['run_time_p50']:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Login throughput benchmark.
+
+Usage: python benchmarks/logins.py [threads] [logins]
+
+Runs ``logins`` logins from ``threads`` concurrent clients against a
+file-backed SQLite database, once hashing on the request threads and once
+with the password hashing process pool, and reports logins/s for each. With
+the pool, throughput should grow with the number of cores. Also counts the
+SQL statements an authenticated page view issues to load the user.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import create_app, db
+from models import User
+
+USERS = 50
+
+def build_app(workers):
+    path = os.path.join(tempfile.mkdtemp(), 'logins.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'AUTO_MIGRATE': True,
+                      'WTF_CSRF_ENABLED': False, 'PASSWORD_HASH_WORKERS': workers, 'JOBS_WORKERS': 0})
+    with app.app_context():
+        for i in range(USERS):
+            user = User(username=f'donor{i}', email=f'donor{i}@example.com', role='donor')
+            user.set_password('secret123')
+            db.session.add(user)
+        db.session.commit()
+    return app
+
+def run(app, threads, logins):
+    remaining = iter(range(logins))
+    lock = threading.Lock()
+    failures = []
+
+    def client_loop():
+        while True:
+            with lock:
+                n = next(remaining, None)
+            if n is None:
+                return
+            client = app.test_client()
+            response = client.post('/login', data={'email': f'donor{n % USERS}@example.com', 'password': 'secret123'})
+            if response.status_code != 302 or '/login' in response.location:
+                failures.append(n)
+
+    workers = [threading.Thread(target=client_loop) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    assert not failures, f'{len(failures)} logins failed'
+    return logins / elapsed
+
+def user_queries(app):
+    client = app.test_client()
+    client.post('/login', data={'email': 'donor0@example.com', 'password': 'secret123'})
+    client.get('/notifications')
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        client.get('/notifications')
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+    return sum(1 for statement in statements if 'FROM user' in statement)
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 2 * (os.cpu_count() or 1)
+    logins = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    cores = os.cpu_count() or 1
+    print(f"threads={threads} logins={logins} cores={cores}")
+    inline = build_app(0)
+    print(f"hashing on request threads: {run(inline, threads, logins):7.1f} logins/s")
+    pooled = build_app(cores)
+    print(f"hashing in {cores} process(es):   {run(pooled, threads, logins):7.1f} logins/s")
+    print(f"user queries per authenticated request: {user_queries(pooled)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Blood request matching throughput benchmark.
+
+Usage: python benchmarks/matching.py [donors] [pending_requests]
+
+Runs against an in-memory SQLite database so the development database is
+left untouched.
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, DonorProfile, BloodInventory, BloodRequest
+from matching import BLOOD_TYPES, match_pending_requests, match_request
+
+def populate(donors, requests, rng):
+    now = datetime.utcnow()
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'role': 'donor'}
+        for i in range(1, donors + 1)
+    ])
+    db.session.execute(db.insert(DonorProfile), [
+        {'user_id': i, 'blood_type': rng.choice(BLOOD_TYPES), 'availability_status': 'available',
+         'last_donation': now - timedelta(days=rng.randint(0, 365)) if rng.random() < 0.7 else None}
+        for i in range(1, donors + 1)
+    ])
+    db.session.execute(db.insert(BloodRequest), [
+        {'recipient_id': 1, 'blood_type': rng.choice(BLOOD_TYPES), 'quantity_ml': rng.choice([450, 900, 1350]),
+         'hospital_name': 'General', 'contact_number': '555-0100', 'emergency': rng.random() < 0.3,
+         'status': 'pending', 'created_at': now - timedelta(minutes=rng.randint(0, 1440))}
+        for _ in range(requests)
+    ])
+    for item in BloodInventory.query.all():
+        item.quantity_ml = rng.randint(0, 20000)
+    db.session.commit()
+
+app = create_app('testing')
+
+def main():
+    donors = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    with app.app_context():
+        populate(donors, requests, random.Random(7))
+
+        start = time.perf_counter()
+        matches = match_pending_requests()
+        batch = time.perf_counter() - start
+        db.session.expunge_all()
+
+        pending = BloodRequest.query.filter_by(status='pending').all()
+        start = time.perf_counter()
+        for blood_request in pending:
+            match_request(blood_request)
+        single = time.perf_counter() - start
+
+        short = sum(1 for match in matches if match.shortfall_ml)
+        print(f"donors={donors} pending={len(matches)} short_of_stock={short}")
+        print(f"batch:      {batch * 1000:.1f}ms total, {len(matches) / batch:.0f} requests/s")
+        print(f"one-by-one: {single * 1000:.1f}ms total, {len(pending) / single:.0f} requests/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Query plan regression check for the donor search paths.
+
+Usage: python benchmarks/query_plans.py
+
+Runs each search through the real code path on a seeded SQLite database,
+captures the SQL it issues and runs EXPLAIN QUERY PLAN on it. Exits non-zero
+if any statement falls back to a full scan of donor_profile.
+"""
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import create_app, db
+from models import User, DonorProfile, BloodRequest
+from geo import geo_cell, load_zip_centroids, nearby_donors
+from locations import autocomplete, location_filter, normalize_location
+from matching import match_requests
+from scheduling import eligible_donors
+
+app = create_app('testing')
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+CITIES = [('Boston', 'MA'), ('New York', 'NY'), ('Chicago', 'IL'), ('Houston', 'TX'), ('Phoenix', 'AZ'),
+          ('Philadelphia', 'PA'), ('San Francisco', 'CA'), ('Seattle', 'WA'), ('Denver', 'CO'), ('Miami', 'FL')]
+
+def populate(count, rng):
+    centroids = list(load_zip_centroids().items())
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'role': 'donor'}
+        for i in range(1, count + 1)
+    ])
+    rows = []
+    for i in range(1, count + 1):
+        city, state = rng.choice(CITIES)
+        zip_code, (lat, lon) = rng.choice(centroids)
+        lat, lon = lat + rng.uniform(-2.0, 2.0), lon + rng.uniform(-2.0, 2.0)
+        rows.append({'user_id': i, 'blood_type': rng.choice(BLOOD_TYPES), 'availability_status': 'available',
+                     'city': city, 'state': state, 'city_norm': normalize_location(city),
+                     'state_norm': normalize_location(state), 'zip_code': zip_code,
+                     'latitude': lat, 'longitude': lon, 'geo_cell': geo_cell(lat, lon),
+                     'last_donation': datetime(2026, 1, 1) - timedelta(days=rng.randint(0, 720))
+                     if rng.random() < 0.7 else None})
+    db.session.execute(db.insert(DonorProfile), rows)
+    db.session.commit()
+    # Give the planner real statistics, as a long-running database would have.
+    db.session.execute(db.text('ANALYZE'))
+
+def capture(fn):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+def plan(statement, parameters):
+    cursor = db.session.connection().connection.cursor()
+    return [row[3] for row in cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+CASES = {
+    'blood type + zip': lambda: DonorProfile.query.join(User).filter(
+        DonorProfile.blood_type == 'O+', DonorProfile.availability_status == 'available',
+        DonorProfile.zip_code == '02108').limit(200).all(),
+    'zip only': lambda: DonorProfile.query.join(User).filter(DonorProfile.zip_code == '10001').limit(200).all(),
+    'city substring': lambda: DonorProfile.query.join(User).filter(location_filter('city', 'franc')).limit(200).all(),
+    'city prefix (short)': lambda: DonorProfile.query.join(User).filter(location_filter('city', 'Bo')).limit(200).all(),
+    'city + state': lambda: DonorProfile.query.join(User).filter(
+        location_filter('city', 'york'), location_filter('state', 'NY')).limit(200).all(),
+    'city autocomplete': lambda: autocomplete('city', 'bo'),
+    'state autocomplete': lambda: autocomplete('state', 'c'),
+    'radius search': lambda: nearby_donors(DonorProfile.query.join(User), 42.3576, -71.0637, 25, limit=200),
+    'eligible on date': lambda: eligible_donors('O-', date(2026, 6, 1)).limit(200).all(),
+    'compatible donors': lambda: match_requests([BloodRequest(id=1, blood_type='A-', quantity_ml=450, emergency=True)]),
+}
+
+def main():
+    failures = []
+    with app.app_context():
+        populate(20000, random.Random(3))
+        for name, case in CASES.items():
+            details = []
+            for statement, parameters in capture(case):
+                details.extend(plan(statement, parameters))
+            # The FTS5 index is only used when the LIKE reaches it as an L constraint,
+            # "INDEX 0:L0"; a bare "INDEX 0:" walks the whole virtual table.
+            scans = [detail for detail in details if detail.startswith('SCAN donor_profile')
+                     or ('VIRTUAL TABLE INDEX' in detail and 'L' not in detail.rsplit(':', 1)[-1])]
+            print(f"{'FAIL' if scans else 'ok  '} {name}: {' | '.join(details)}")
+            if scans:
+                failures.append(name)
+            db.session.expunge_all()
+    if failures:
+        print('Full scans of donor_profile or the location index in: ' + ', '.join(failures))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Radius search benchmark: donors within N miles of a ZIP code.
+
+Usage: python benchmarks/radius_search.py [donors] [queries]
+
+Runs against an in-memory SQLite database so the development database is
+left untouched.
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, DonorProfile
+from geo import geo_cell, load_zip_centroids, nearby_donors
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+def populate(count, rng):
+    centroids = list(load_zip_centroids().items())
+    users, profiles = [], []
+    for i in range(1, count + 1):
+        zip_code, (lat, lon) = rng.choice(centroids)
+        lat += rng.uniform(-2.0, 2.0)
+        lon += rng.uniform(-2.0, 2.0)
+        users.append({'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'role': 'donor'})
+        profiles.append({
+            'user_id': i, 'blood_type': rng.choice(BLOOD_TYPES), 'zip_code': zip_code,
+            'city': 'City', 'state': 'ST', 'availability_status': 'available',
+            'latitude': lat, 'longitude': lon, 'geo_cell': geo_cell(lat, lon),
+        })
+    db.session.execute(db.insert(User), users)
+    db.session.execute(db.insert(DonorProfile), profiles)
+    db.session.commit()
+
+app = create_app('testing')
+
+def main():
+    donors = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(42)
+    with app.app_context():
+        populate(donors, rng)
+        origins = list(load_zip_centroids().values())
+        timings = []
+        found = 0
+        for _ in range(queries):
+            lat, lon = rng.choice(origins)
+            radius = rng.choice([10, 25, 50, 100])
+            start = time.perf_counter()
+            results = nearby_donors(DonorProfile.query.join(User), lat, lon, radius, limit=200)
+            timings.append((time.perf_counter() - start) * 1000)
+            found += len(results)
+            db.session.expunge_all()
+        timings.sort()
+        print(f"donors={donors} queries={queries} avg_returned={found / queries:.0f}")
+        print(f"p50={statistics.median(timings):.2f}ms "
+              f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms max={timings[-1]:.2f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,424 @@
+"""Latency benchmark for every route, with a stored baseline.
+
+Usage: python benchmarks/routes.py [--users N] [--requests N] [--concurrency 1,4]
+                                   [--gunicorn] [--workers N] [--db PATH]
+                                   [--save-baseline] [--tolerance 0.5]
+
+Seeds a SQLite database with ``seed.generate`` (reused if ``--db`` already
+exists), then drives each route through the Flask test client, and with
+``--gunicorn`` also over HTTP against a local gunicorn, at each concurrency
+level. Reports p50/p95/p99 latency, throughput, SQL statements per request
+and memory (peak allocation per request for the test client, worker RSS for
+gunicorn).
+
+Results are compared with benchmarks/baseline.json for the same mode,
+concurrency and scale. The run exits non-zero if any route's p95 grew by more
+than the tolerance, or if it issues more queries than before.
+``--save-baseline`` records the current results instead; latencies are
+machine specific, so record the baseline where the comparison will run.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from datetime import date, timedelta
+from itertools import count
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import create_app, db
+from seed import SEED_PASSWORD, generate
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+# Latency jitter below this many ms is never reported as a regression.
+SLACK_MS = 2.0
+
+# ``path`` and ``body`` may be callables taking the RunState. ``fresh`` routes
+# get a new client for every request (logged in as ``role`` beforehand, not timed).
+Route = namedtuple('Route', ['name', 'role', 'method', 'path', 'body', 'fresh'], defaults=[None, False])
+
+class RunState:
+    def __init__(self, emails, pending, site_id):
+        self.emails = emails
+        self.site_id = site_id
+        self._pending = iter(pending)
+        # Registrations must not collide with accounts left by earlier runs on a reused --db.
+        self.run_id = int(time.time())
+        self._serial = count()
+        self._lock = threading.Lock()
+
+    def next_pending(self):
+        with self._lock:
+            return next(self._pending)
+
+    def serial(self):
+        with self._lock:
+            return next(self._serial)
+
+def _registration(state):
+    name = f'bench{state.run_id}-{state.serial()}'
+    return {'username': name, 'email': f'{name}@example.com', 'password': SEED_PASSWORD,
+            'confirm_password': SEED_PASSWORD, 'role': 'donor'}
+
+def _schedule_date(state):
+    return {'site_id': state.site_id, 'donation_date': (date.today() + timedelta(days=60 + state.serial() % 300)).isoformat()}
+
+ROUTES = [
+    Route('home', None, 'GET', '/'),
+    Route('api_inventory', None, 'GET', '/api/inventory'),
+    Route('trends_week', 'donor', 'GET', '/api/trends?granularity=week&start=2025-01-01&end=2025-12-31'),
+    Route('trends_day', 'donor', 'GET', '/api/trends?granularity=day&start=2025-01-01&end=2025-12-31'),
+    Route('login_page', None, 'GET', '/login'),
+    Route('login', None, 'POST', '/login',
+          lambda s: {'email': s.emails['donor'], 'password': SEED_PASSWORD}, fresh=True),
+    Route('register_page', None, 'GET', '/register'),
+    Route('register', None, 'POST', '/register', _registration, fresh=True),
+    Route('logout', 'donor', 'GET', '/logout', fresh=True),
+    Route('learn_donation', None, 'GET', '/learn/donation'),
+    Route('learn_process', None, 'GET', '/learn/process'),
+    Route('learn_eligibility', None, 'GET', '/learn/eligibility'),
+    Route('learn_donation_donor', 'donor', 'GET', '/learn/donation'),
+    Route('static_css', None, 'GET', '/static/css/style.css'),
+    Route('search_type_city', None, 'GET', '/donor/search?blood_type=O%2B&city=bos'),
+    Route('search_radius', None, 'GET', '/donor/search?blood_type=A%2B&zip_code=10001&radius=50'),
+    Route('search_zip', None, 'GET', '/donor/search?zip_code=60601'),
+    Route('autocomplete', None, 'GET', '/api/locations/autocomplete?field=city&q=sa'),
+    Route('donor_dashboard', 'donor', 'GET', '/donor/dashboard'),
+    Route('create_profile', 'donor', 'GET', '/donor/create_profile'),
+    Route('schedule_page', 'donor', 'GET', '/donor/schedule_donation'),
+    Route('schedule_donation', 'donor', 'POST', '/donor/schedule_donation', _schedule_date),
+    Route('notifications', 'donor', 'GET', '/notifications'),
+    Route('mark_read', 'donor', 'POST', '/notifications/mark_read', {'mark_all': 'y'}),
+    Route('recipient_dashboard', 'recipient', 'GET', '/recipient/dashboard'),
+    Route('request_page', 'recipient', 'GET', '/recipient/request_blood'),
+    Route('request_blood', 'recipient', 'POST', '/recipient/request_blood', {
+        'blood_type': 'A+', 'quantity_ml': '450', 'hospital_name': 'General Hospital',
+        'contact_number': '555-0100'}),
+    Route('admin_dashboard', 'admin', 'GET', '/admin/dashboard'),
+    Route('admin_api_requests', 'admin', 'GET', '/admin/api/requests?status=pending'),
+    Route('admin_api_users', 'admin', 'GET', '/admin/api/users?role=donor'),
+    Route('inventory_page', 'admin', 'GET', '/admin/update_inventory'),
+    Route('update_inventory', 'admin', 'POST', '/admin/update_inventory',
+          {'blood_type': 'O-', 'quantity_ml': '450', 'operation': 'add'}),
+    Route('inventory_bulk', 'admin', 'POST', '/admin/inventory/bulk',
+          {'adjustments': [{'blood_type': 'A+', 'quantity_ml': 450}, {'blood_type': 'B+', 'quantity_ml': 450}]}),
+    Route('import_inventory', 'admin', 'POST', '/admin/import/inventory',
+          'blood_type,quantity_ml,operation\nAB+,450,add\nAB-,450,add\n'),
+    Route('export_inventory', 'admin', 'GET', '/admin/export/inventory'),
+    Route('handle_request', 'admin', 'GET', lambda s: f'/admin/handle_request/{s.next_pending()}/approve'),
+    Route('triage_queue', 'admin', 'GET', '/admin/api/triage_queue?limit=50'),
+    Route('matches', 'admin', 'GET', '/admin/matches?limit=50'),
+    Route('job_metrics', 'admin', 'GET', '/admin/jobs/metrics'),
+]
+
+def _encode(body):
+    """Return (bytes, content type) for a route body."""
+    if body is None:
+        return None, None
+    if isinstance(body, str):
+        return body.encode(), 'text/csv'
+    if any(isinstance(value, (list, dict)) for value in body.values()):
+        return json.dumps(body).encode(), 'application/json'
+    return urllib.parse.urlencode(body).encode(), 'application/x-www-form-urlencoded'
+
+def _resolve(route, state):
+    path = route.path(state) if callable(route.path) else route.path
+    body = route.body(state) if callable(route.body) else route.body
+    return path, _encode(body)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+# Test client mode
+
+_thread_queries = threading.local()
+
+def _count_query(*args):
+    _thread_queries.count = getattr(_thread_queries, 'count', 0) + 1
+
+class TestClientDriver:
+    mode = 'testclient'
+
+    def __init__(self, app, state):
+        self.app, self.state = app, state
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    def client(self, role):
+        client = self.app.test_client()
+        if role:
+            response = client.post('/login', data={'email': self.state.emails[role], 'password': SEED_PASSWORD})
+            assert response.status_code == 302, f'login as {role} failed'
+        return client
+
+    def request(self, client, route):
+        path, (data, content_type) = _resolve(route, self.state)
+        _thread_queries.count = 0
+        start = time.perf_counter()
+        response = client.open(path, method=route.method, data=data, content_type=content_type)
+        response.get_data()
+        elapsed = time.perf_counter() - start
+        return elapsed, response.status_code, _thread_queries.count
+
+    def memory(self, route):
+        client = self.client(route.role)
+        tracemalloc.start()
+        try:
+            self.request(client, route)
+            return f'{tracemalloc.get_traced_memory()[1] / 1024:.0f}KB'
+        finally:
+            tracemalloc.stop()
+
+    def close(self):
+        event.remove(Engine, 'before_cursor_execute', _count_query)
+
+# Gunicorn mode
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None
+
+class GunicornDriver:
+    mode = 'gunicorn'
+
+    def __init__(self, database, state, workers, threads):
+        self.state, self.workers = state, workers
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        overrides = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}', 'WTF_CSRF_ENABLED': False,
+                     'INSTRUMENTATION': True, 'SLOW_QUERY_MS': 60000, 'JOBS_WORKERS': 0}
+        self.process = subprocess.Popen(
+            ['gunicorn', '-w', str(workers), '--threads', str(threads), '-b', f'127.0.0.1:{self.port}',
+             '--log-level', 'warning', f'app:create_app({overrides!r})'], cwd=ROOT)
+        self.base = f'http://127.0.0.1:{self.port}'
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(self.base + '/metrics', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            self.close()
+            raise RuntimeError('gunicorn did not start')
+
+    def client(self, role):
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                             _NoRedirect())
+        if role:
+            data = urllib.parse.urlencode({'email': self.state.emails[role], 'password': SEED_PASSWORD}).encode()
+            status = self._open(opener, 'POST', '/login', data, 'application/x-www-form-urlencoded')
+            assert status == 302, f'login as {role} failed'
+        return opener
+
+    def _open(self, opener, method, path, data, content_type):
+        request = urllib.request.Request(self.base + path, data=data, method=method)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        try:
+            with opener.open(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def request(self, client, route):
+        path, (data, content_type) = _resolve(route, self.state)
+        start = time.perf_counter()
+        status = self._open(client, route.method, path, data, content_type)
+        return time.perf_counter() - start, status, None
+
+    def sql_totals(self):
+        # Only meaningful with one worker: /metrics reports the worker that answers.
+        if self.workers != 1:
+            return None
+        totals = [0.0, 0.0]
+        for line in urllib.request.urlopen(self.base + '/metrics').read().decode().splitlines():
+            if line.startswith(('http_request_sql_queries_sum', 'http_request_sql_queries_count')) \
+                    and 'endpoint="metrics"' not in line:
+                totals[line.startswith('http_request_sql_queries_count')] += float(line.rsplit(' ', 1)[1])
+        return totals
+
+    def memory(self, route):
+        try:
+            with open(f'/proc/{self.process.pid}/task/{self.process.pid}/children') as f:
+                children = f.read().split()
+            rss = 0
+            for pid in children:
+                with open(f'/proc/{pid}/status') as f:
+                    rss += next(int(line.split()[1]) for line in f if line.startswith('VmRSS'))
+            return f'{rss / 1024:.0f}MB'
+        except OSError:
+            return '-'
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+# Runner
+
+def run_route(driver, route, concurrency, requests):
+    warm = driver.client(route.role)
+    driver.request(warm, route)
+    before = driver.sql_totals() if hasattr(driver, 'sql_totals') else None
+    latencies, queries, failures = [], [], []
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+
+    def loop():
+        client = None if route.fresh else driver.client(route.role)
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            if route.fresh:
+                client = driver.client(route.role)
+            elapsed, status, statements = driver.request(client, route)
+            with lock:
+                latencies.append(elapsed)
+                if statements is not None:
+                    queries.append(statements)
+                if status >= 400:
+                    failures.append(status)
+
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    if before is not None:
+        after = driver.sql_totals()
+        # The untimed logins of fresh routes are counted too, so this is approximate for those.
+        queries = [(after[0] - before[0]) / max(1, after[1] - before[1])]
+    return {
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'rps': requests / wall,
+        'queries': round(sum(queries) / len(queries), 1) if queries else None,
+        'memory': driver.memory(route),
+        'failures': len(failures),
+    }
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        limit = base['p95_ms'] * (1 + tolerance) + SLACK_MS
+        if result['p95_ms'] > limit:
+            regressions.append(f"{name}: p95 {result['p95_ms']:.1f}ms > {limit:.1f}ms (baseline {base['p95_ms']:.1f}ms)")
+        if result['queries'] is not None and base.get('queries') is not None \
+                and result['queries'] > base['queries'] + 0.5:
+            regressions.append(f"{name}: {result['queries']} queries per request (baseline {base['queries']})")
+    return regressions
+
+def run_mode(driver, args, baselines):
+    regressions = []
+    for concurrency in args.concurrency:
+        key = f'{driver.mode}-c{concurrency}-u{args.users}'
+        print(f"\n{key}")
+        print(f"{'route':<22}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'queries':>9}{'memory':>9}")
+        results = {}
+        for route in ROUTES:
+            result = results[route.name] = run_route(driver, route, concurrency, args.requests)
+            queries = '-' if result['queries'] is None else result['queries']
+            flag = f"  {result['failures']} failed" if result['failures'] else ''
+            print(f"{route.name:<22}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                  f"{result['rps']:>9.0f}{queries:>9}{result['memory']:>9}{flag}")
+            if result['failures']:
+                regressions.append(f"{key} {route.name}: {result['failures']} failed requests")
+        if args.save_baseline:
+            baselines[key] = results
+        elif key in baselines:
+            regressions.extend(f'{key} {line}' for line in compare(results, baselines[key], args.tolerance))
+        else:
+            print(f'(no baseline for {key})')
+    return regressions
+
+def prepare(args):
+    database = args.db or os.path.join(tempfile.mkdtemp(), 'routes.db')
+    fresh = not os.path.exists(database)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}', 'AUTO_MIGRATE': True,
+                      'WTF_CSRF_ENABLED': False, 'JOBS_WORKERS': 0})
+    from models import BloodRequest, DonationSite, DonorProfile, User
+    with app.app_context():
+        if fresh:
+            start = time.perf_counter()
+            counts = generate(args.users, args.seed)
+            print(f"seeded {sum(counts.values())} rows in {time.perf_counter() - start:.1f}s")
+        emails = {
+            'donor': db.session.query(User.email).join(DonorProfile).filter(User.role == 'donor')
+                .order_by(User.id).limit(1).scalar(),
+            'recipient': db.session.query(User.email).filter(User.role == 'recipient').order_by(User.id).limit(1).scalar(),
+            'admin': db.session.query(User.email).filter(User.role == 'admin').order_by(User.id).limit(1).scalar(),
+        }
+        pending = [request_id for (request_id,) in db.session.query(BloodRequest.id).filter(
+            BloodRequest.status == 'pending').order_by(BloodRequest.id)]
+        site_id = db.session.query(db.func.min(DonationSite.id)).scalar()
+    return app, database, emails, pending, site_id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route and concurrency level.')
+    parser.add_argument('--concurrency', type=lambda text: [int(n) for n in text.split(',')], default=[1, 4])
+    parser.add_argument('--gunicorn', action='store_true', help='Also benchmark over HTTP against gunicorn.')
+    parser.add_argument('--workers', type=int, default=1, help='Gunicorn workers.')
+    parser.add_argument('--db', help='SQLite file to seed, or reuse if it exists.')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed p95 growth as a fraction.')
+    args = parser.parse_args()
+
+    app, database, emails, pending, site_id = prepare(args)
+    needed = args.requests * len(args.concurrency) * (2 if args.gunicorn else 1) + 10
+    if len(pending) < needed:
+        parser.error(f'only {len(pending)} pending requests for handle_request; use more --users')
+    state = RunState(emails, pending, site_id)
+    baselines = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baselines = json.load(f)
+
+    driver = TestClientDriver(app, state)
+    try:
+        regressions = run_mode(driver, args, baselines)
+    finally:
+        driver.close()
+    if args.gunicorn:
+        driver = GunicornDriver(database, state, args.workers, max(args.concurrency))
+        try:
+            regressions += run_mode(driver, args, baselines)
+        finally:
+            driver.close()
+
+    if args.save_baseline:
+        with open(BASELINE, 'w') as f:
+            json.dump(baselines, f, indent=1, sort_keys=True)
+        print(f'\nBaseline saved to {BASELINE}')
+    elif regressions:
+        print('\nRegressions:\n  ' + '\n  '.join(regressions))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
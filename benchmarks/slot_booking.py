@@ -0,0 +1,80 @@
+"""Concurrent slot booking check.
+
+Usage: python benchmarks/slot_booking.py [donors] [threads] [capacity]
+
+``donors`` donors book the same day at one site from ``threads`` threads
+against a file-backed SQLite database, with room for only ``capacity`` of
+them. Reports bookings/s and exits non-zero if the slot was overbooked or its
+counter disagrees with the bookings recorded.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import DonationSchedule, DonationSite, DonationSlot, DonorProfile, User
+from scheduling import SlotUnavailable, book_donation
+
+def main():
+    donors = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    capacity = int(sys.argv[3]) if len(sys.argv) > 3 else donors // 2
+    path = os.path.join(tempfile.mkdtemp(), 'slots.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'AUTO_MIGRATE': True, 'JOBS_WORKERS': 0})
+    day = date.today() + timedelta(days=7)
+    with app.app_context():
+        db.session.execute(db.insert(User), [
+            {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'role': 'donor'}
+            for i in range(1, donors + 1)
+        ])
+        db.session.execute(db.insert(DonorProfile), [{'user_id': i, 'blood_type': 'O+'} for i in range(1, donors + 1)])
+        site = DonationSite(name='Drive', daily_capacity=capacity)
+        db.session.add(site)
+        db.session.commit()
+        site_id = site.id
+
+    queue = iter(range(1, donors + 1))
+    lock = threading.Lock()
+    outcomes = {'booked': 0, 'full': 0}
+
+    def worker():
+        with app.app_context():
+            site = db.session.get(DonationSite, site_id)
+            while True:
+                with lock:
+                    donor_id = next(queue, None)
+                if donor_id is None:
+                    return
+                try:
+                    book_donation(donor_id, site, day)
+                    outcome = 'booked'
+                except SlotUnavailable:
+                    outcome = 'full'
+                with lock:
+                    outcomes[outcome] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        slot = DonationSlot.query.filter_by(site_id=site_id, day=day).one()
+        recorded = DonationSchedule.query.filter_by(site_id=site_id).count()
+    print(f"donors={donors} threads={threads} capacity={capacity}")
+    print(f"{donors / elapsed:,.0f} booking attempts/s; booked {outcomes['booked']}, turned away {outcomes['full']}")
+    print(f"slot counter {slot.booked}/{slot.capacity}, bookings recorded {recorded}")
+    if not (slot.booked == recorded == outcomes['booked'] == min(donors, capacity)):
+        print('FAIL: slot accounting is inconsistent')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Cold-start benchmark: import time, create_app() time and first request.
+
+Usage: python benchmarks/startup.py [runs]
+
+Each run is a fresh interpreter, as a newly forked or spawned worker would
+be. It also checks that building the app issues no SQL at all, so scaling the
+worker count never touches the schema.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, os, sys, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+app = app_module.create_app()
+created = time.perf_counter()
+with app.app_context():
+    create_statements = len(statements)
+    response = app.test_client().get('/learn/eligibility')
+first = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first - created) * 1000,
+    'create_app_sql': create_statements,
+    'status': response.status_code,
+}))
+'''
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    database = os.path.join(tempfile.mkdtemp(), 'startup.db')
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}', APP_CONFIG='production')
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'upgrade-db'],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms'):
+        values = [sample[key] for sample in samples]
+        print(f"{key:18} median={statistics.median(values):7.2f} max={max(values):7.2f}")
+    sql = max(sample['create_app_sql'] for sample in samples)
+    print(f"SQL statements issued by create_app(): {sql}")
+    if sql or any(sample['status'] != 200 for sample in samples):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Trends rollup benchmark.
+
+Usage: python benchmarks/trends.py [users]
+
+Seeds a file-backed SQLite database, then compares a year of weekly and
+daily trends read from the rollup tables with the same numbers computed
+from the source tables, and reports how long a full rebuild takes. The
+rollup reads should stay flat as history grows; the ad hoc scan does not.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import BloodRequest, DonationSchedule
+from rollups import _day, rebuild, series
+from seed import generate
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+def ad_hoc(start, end):
+    # What the dashboard would have to run without the rollups.
+    requests = db.session.query(_day(BloodRequest.created_at), db.func.count()).filter(
+        BloodRequest.created_at >= start, BloodRequest.created_at < end + timedelta(days=1),
+    ).group_by(_day(BloodRequest.created_at)).all()
+    donations = db.session.query(_day(DonationSchedule.scheduled_date), db.func.count()).filter(
+        DonationSchedule.status == 'completed', DonationSchedule.scheduled_date >= start,
+        DonationSchedule.scheduled_date < end + timedelta(days=1),
+    ).group_by(_day(DonationSchedule.scheduled_date)).all()
+    return requests, donations
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    path = os.path.join(tempfile.mkdtemp(), 'trends.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'AUTO_MIGRATE': True,
+                      'PASSWORD_HASH_WORKERS': 0})
+    with app.app_context():
+        counts = generate(users)
+        print(f"users={users} requests={counts['blood_requests']} schedules={counts['donation_schedules']}")
+        rebuild_ms, rows = timed(rebuild, repeat=1)
+        print(f'full rebuild: {rebuild_ms:.0f} ms, {rows} daily rows')
+
+        end = date(2026, 1, 1)
+        start = end - timedelta(days=364)
+        week_ms, weekly = timed(lambda: series(start, end, 'week'))
+        day_ms, daily = timed(lambda: series(start, end, 'day'))
+        scan_ms, (requests, _) = timed(lambda: ad_hoc(start, end))
+        assert sum(daily['requests']) == sum(count for _, count in requests)
+        assert sum(weekly['requests']) >= sum(daily['requests'])
+        print(f'one year weekly from rollups: {week_ms:.2f} ms')
+        print(f'one year daily from rollups:  {day_ms:.2f} ms')
+        print(f'one year daily, ad hoc scan:  {scan_ms:.2f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Triage throughput: one request at a time versus batches.
+
+Usage: python benchmarks/triage.py [pending] [decisions] [batch]
+
+Fills a file-backed SQLite database with ``pending`` pending requests and
+some blood units, then, as an admin through the test client, decides
+``decisions`` requests the old way (GET /admin/handle_request/<id>/approve
+and the dashboard reload it redirects to) and another ``decisions`` through
+POST /admin/requests/triage in batches of ``batch``, reserving units. Reports
+decisions per minute for both, the triage queue latency with the full
+backlog, and checks that the ledger and the request rollups still agree.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from inventory import verify_inventory
+from matching import BLOOD_TYPES
+from models import BloodRequest, DailyRollup, User
+from units import receive_units
+
+def seed(pending, now):
+    rng = random.Random(0)
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    admin.set_password('password')
+    recipients = [{'username': f'recipient{i}', 'email': f'recipient{i}@example.com', 'role': 'recipient'}
+                  for i in range(200)]
+    db.session.add(admin)
+    db.session.execute(db.insert(User), recipients)
+    recipient_ids = db.session.query(User.id).filter(User.role == 'recipient').all()
+    rows = [{'recipient_id': rng.choice(recipient_ids)[0], 'blood_type': rng.choice(BLOOD_TYPES),
+             'quantity_ml': rng.choice([450, 900]), 'hospital_name': 'General', 'contact_number': '555-0100',
+             'emergency': rng.random() < 0.1, 'status': 'pending',
+             'created_at': now - timedelta(minutes=rng.uniform(0, 60 * 24 * 30))} for _ in range(pending)]
+    for i in range(0, len(rows), 10000):
+        db.session.execute(BloodRequest.__table__.insert(), rows[i:i + 10000])
+    db.session.commit()
+    from rollups import rebuild
+    rebuild()
+    for blood_type in BLOOD_TYPES:
+        receive_units(blood_type, 2000, now - timedelta(days=3))
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+def rate(count, seconds):
+    return count / seconds * 60
+
+def main():
+    pending = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    decisions = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    batch = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    path = os.path.join(tempfile.mkdtemp(), 'triage.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'AUTO_MIGRATE': True,
+                      'PASSWORD_HASH_WORKERS': 0, 'JOBS_WORKERS': 0, 'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        seed(pending, datetime.utcnow())
+    client = app.test_client()
+    assert client.post('/login', data={'email': 'admin@example.com', 'password': 'password'}).status_code == 302
+
+    timings = []
+    for _ in range(50):
+        start = time.perf_counter()
+        queue = client.get(f'/admin/api/triage_queue?limit={batch}').get_json()['items']
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f'triage queue of {batch} from {pending} pending: p50 {timings[len(timings) // 2] * 1000:.1f} ms')
+    assert queue[0]['emergency']
+
+    ids = [item['id'] for item in client.get(f'/admin/api/triage_queue?limit={min(decisions * 2, 500)}').get_json()['items']]
+    with app.app_context():
+        ids += [request_id for (request_id,) in db.session.query(BloodRequest.id).filter(
+            BloodRequest.status == 'pending', BloodRequest.id.notin_(ids)).limit(decisions * 2 - len(ids))]
+    one_by_one, batched = ids[:decisions], ids[decisions:decisions * 2]
+
+    start = time.perf_counter()
+    for request_id in one_by_one:
+        response = client.get(f'/admin/handle_request/{request_id}/approve', follow_redirects=True)
+        assert response.status_code == 200
+    single = time.perf_counter() - start
+    print(f'handle_request + dashboard: {rate(decisions, single):8.0f} decisions/min')
+
+    start = time.perf_counter()
+    for i in range(0, len(batched), batch):
+        chunk = batched[i:i + batch]
+        response = client.post('/admin/requests/triage', json={'reserve': True, 'decisions': [
+            {'id': request_id, 'action': 'approve' if n % 4 else 'reject'} for n, request_id in enumerate(chunk)]})
+        assert response.status_code == 200 and not response.get_json()['skipped'], response.get_json()
+    batch_seconds = time.perf_counter() - start
+    print(f'batch triage of {batch}:      {rate(decisions, batch_seconds):8.0f} decisions/min')
+
+    with app.app_context():
+        assert not verify_inventory(), verify_inventory()
+        rolled = dict(db.session.query(DailyRollup.status, db.func.sum(DailyRollup.count)).filter(
+            DailyRollup.metric == 'requests').group_by(DailyRollup.status))
+        actual = dict(db.session.query(BloodRequest.status, db.func.count()).group_by(BloodRequest.status))
+        assert {status: count for status, count in rolled.items() if count} == actual, (rolled, actual)
+
+if __name__ == '__main__':
+    main()
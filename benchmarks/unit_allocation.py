@@ -0,0 +1,88 @@
+"""FEFO unit allocation benchmark.
+
+Usage: python benchmarks/unit_allocation.py [units] [requests]
+
+Stocks a file-backed SQLite database with ``units`` blood units collected
+over the last six weeks, then approves ``requests`` requests through
+allocate_units and runs the expiry sweep a week later. Allocation time
+should not grow with the number of units in stock; the run also checks that
+every request got the earliest-expiring units and that the per-type totals
+still match the ledger.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from inventory import apply_adjustments, verify_inventory
+from matching import BLOOD_TYPES
+from models import BloodRequest, BloodUnit, User
+from units import SHELF_LIFE, UNIT_VOLUME_ML, allocate_units, expire_units
+
+def stock(count, now):
+    rng = random.Random(0)
+    rows = []
+    for _ in range(count):
+        collected_at = now - timedelta(days=rng.uniform(0, 41))
+        rows.append({'blood_type': rng.choice(BLOOD_TYPES), 'volume_ml': UNIT_VOLUME_ML, 'collected_at': collected_at,
+                     'expires_at': collected_at + SHELF_LIFE, 'status': 'available', 'created_at': now})
+    for i in range(0, len(rows), 10000):
+        db.session.execute(BloodUnit.__table__.insert(), rows[i:i + 10000])
+    totals = {}
+    for row in rows:
+        totals[row['blood_type']] = totals.get(row['blood_type'], 0) + row['volume_ml']
+    apply_adjustments(sorted(totals.items()), 'benchmark')
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+def main():
+    units = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    path = os.path.join(tempfile.mkdtemp(), 'units.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'AUTO_MIGRATE': True,
+                      'PASSWORD_HASH_WORKERS': 0, 'JOBS_WORKERS': 0})
+    now = datetime.utcnow()
+    rng = random.Random(1)
+    with app.app_context():
+        start = time.perf_counter()
+        stock(units, now)
+        print(f'stocked {units} units in {time.perf_counter() - start:.1f}s')
+        recipient = User(username='recipient', email='recipient@example.com', role='recipient')
+        db.session.add(recipient)
+        db.session.flush()
+        blood_requests = [BloodRequest(recipient_id=recipient.id, blood_type=rng.choice(BLOOD_TYPES),
+                                       quantity_ml=rng.choice([450, 900, 1350]), hospital_name='General',
+                                       contact_number='555-0100') for _ in range(requests)]
+        db.session.add_all(blood_requests)
+        db.session.commit()
+
+        timings = []
+        for blood_request in blood_requests:
+            first_expiry = db.session.query(db.func.min(BloodUnit.expires_at)).filter(
+                BloodUnit.blood_type == blood_request.blood_type, BloodUnit.status == 'available',
+                BloodUnit.expires_at > now).scalar()
+            start = time.perf_counter()
+            allocation = allocate_units(blood_request, now=now)
+            db.session.commit()
+            timings.append(time.perf_counter() - start)
+            exact = [unit_id for blood_type, unit_id, _ in allocation.units if blood_type == blood_request.blood_type]
+            if exact:
+                earliest = db.session.query(db.func.min(BloodUnit.expires_at)).filter(BloodUnit.id.in_(exact)).scalar()
+                assert earliest == first_expiry, (earliest, first_expiry)
+        timings.sort()
+        print(f'{requests} allocations: p50 {timings[len(timings) // 2] * 1000:.2f} ms, '
+              f'p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} ms')
+
+        start = time.perf_counter()
+        expired = expire_units(now + timedelta(days=7))
+        print(f'expiry sweep retired {sum(count for count, _ in expired.values())} units '
+              f'in {(time.perf_counter() - start) * 1000:.0f} ms')
+        assert not verify_inventory(), verify_inventory()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import os
+
+class Config:
+    SECRET_KEY = os.environ.get("SESSION_SECRET", "your-secret-key")
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///blood_donation.db")
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Engine settings, see database.py. DATABASE_URL picks the backend:
+    # SQLite locally, postgresql://... in production.
+    # Optional read-only copy that views marked use_replica query.
+    DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+    # Connection pool, for server databases.
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+    # Applied to every new SQLite connection. WAL lets readers run alongside
+    # the single writer; NORMAL sync is durable across app crashes in WAL mode.
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 65536))
+    SQLITE_MMAP_SIZE_MB = int(os.environ.get("SQLITE_MMAP_SIZE_MB", 256))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    # Schema upgrades normally run once per deployment (`flask upgrade-db`),
+    # not in every worker that calls create_app().
+    AUTO_MIGRATE = False
+    # Background job threads per process; 0 leaves jobs to `flask jobs work`.
+    JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", 2))
+    JOBS_INLINE = False
+    # Werkzeug hash method including its cost; stored hashes made with any
+    # other setting are upgraded on the user's next login.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    # Processes that hash passwords off the request thread; 0 hashes inline.
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+    # Pre-render the learn pages, cache template fragments and serve static/
+    # from memory, precompressed. Static URLs carry a content hash, so they
+    # can be cached for STATIC_MAX_AGE seconds.
+    PAGE_CACHE = True
+    STATIC_MAX_AGE = 365 * 24 * 3600
+    # Request/SQL/template metrics at /metrics; off unless INSTRUMENTATION=1.
+    INSTRUMENTATION = os.environ.get("INSTRUMENTATION", "").lower() in ("1", "true", "yes")
+    SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 100))
+    # Fraction of requests to run under cProfile, dumped to PROFILE_DIR
+    # (default: <instance>/profiles) as <endpoint>-<time>.prof.
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR")
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    PAGE_CACHE = False
+
+class ProductionConfig(Config):
+    pass
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL", "sqlite://")
+    WTF_CSRF_ENABLED = False
+    AUTO_MIGRATE = True
+    # An in-memory database is one shared connection, so jobs run in the
+    # request that queued them instead of on worker threads.
+    JOBS_INLINE = True
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    PASSWORD_HASH_WORKERS = 0
+
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
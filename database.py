@@ -0,0 +1,110 @@
+import functools
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Bind key of the optional read replica engine.
+REPLICA = 'replica'
+
+def normalize_url(url):
+    """Pin bare PostgreSQL URLs, including the old ``postgres://`` scheme some
+    hosts still hand out, to psycopg2, the driver in requirements.txt."""
+    if not url:
+        return url
+    parsed = make_url(url)
+    if parsed.drivername in ('postgres', 'postgresql'):
+        return parsed.set(drivername='postgresql+psycopg2').render_as_string(hide_password=False)
+    return url
+
+def _in_memory(url):
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+def engine_options(config, url, read_only=False):
+    """Engine keyword arguments for ``url`` from the DB_* and SQLITE_* settings."""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        if _in_memory(url):
+            return {}
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if read_only and url.get_backend_name() == 'postgresql':
+        options['connect_args'] = {'options': '-c default_transaction_read_only=on'}
+    return options
+
+def configure(app):
+    """Fill in the engine settings; call before ``db.init_app``.
+
+    Explicit SQLALCHEMY_ENGINE_OPTIONS and SQLALCHEMY_BINDS entries win over
+    the values derived here.
+    """
+    config = app.config
+    config['SQLALCHEMY_DATABASE_URI'] = normalize_url(config['SQLALCHEMY_DATABASE_URI'])
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config, config['SQLALCHEMY_DATABASE_URI']),
+        **(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}),
+    }
+    replica = normalize_url(config.get('DATABASE_REPLICA_URL'))
+    if replica:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(REPLICA, {'url': replica, **engine_options(config, replica, read_only=True)})
+        config['SQLALCHEMY_BINDS'] = binds
+
+def _sqlite_pragmas(config, read_only):
+    pragmas = [
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE_MB'] * 1024 * 1024),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+    ]
+    if not read_only:
+        # The journal mode is stored in the database file, so a read-only
+        # connection inherits whatever the writer set.
+        pragmas.insert(0, ('journal_mode', config['SQLITE_JOURNAL_MODE']))
+    return pragmas
+
+def _set_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas:
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+def init_app(app):
+    """Apply the SQLite pragmas to every new connection; call after ``db.init_app``."""
+    from app import db
+    with app.app_context():
+        engines = dict(db.engines)
+    for key, engine in engines.items():
+        if engine.dialect.name == 'sqlite' and not _in_memory(engine.url):
+            pragmas = _sqlite_pragmas(app.config, read_only=key == REPLICA)
+            event.listen(engine, 'connect', functools.partial(_set_pragmas, pragmas))
+
+class RoutingSession(Session):
+    """Sends SELECTs to the replica while a view marked ``use_replica`` runs.
+
+    Flushes and every other statement still go to the primary, so a view
+    that also writes stays correct; it may just read slightly stale rows.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and getattr(clause, 'is_select', False)
+                and has_app_context() and g.get('use_replica')):
+            engine = self._db.engines.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+def use_replica(view):
+    """Let a read-heavy view query DATABASE_REPLICA_URL, when one is configured."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -58,6 +58,10 @@ class InventoryUpdateForm(FlaskForm):
     operation = SelectField('Operation', choices=[('add', 'Add'), ('remove', 'Remove')], validators=[DataRequired()])
 
 class DonationScheduleForm(FlaskForm):
+    site_id = SelectField('Donation Site', coerce=int, validators=[DataRequired()])  # choices set in the view
     donation_date = DateField('Preferred Donation Date', 
                             validators=[DataRequired()],
-                            default=datetime.utcnow() + timedelta(days=1))
\ No newline at end of file
+                            default=datetime.utcnow() + timedelta(days=1))
+
+class MarkNotificationsReadForm(FlaskForm):
+    mark_all = BooleanField('Mark all as read')
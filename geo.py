@@ -0,0 +1,95 @@
+import csv
+import gzip
+import math
+import os
+from functools import lru_cache
+
+# Centroids are read from a Census ZCTA gazetteer style file (tab separated,
+# GEOID / INTPTLAT / INTPTLONG columns, optionally gzipped), so a newer
+# national gazetteer can replace the bundled file without code changes.
+# See data/ZIP_CENTROIDS_NOTICE.txt for where the bundled one comes from.
+ZIP_CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'zip_centroids.txt.gz')
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.17
+CELL_SIZE_DEG = 0.5
+CELL_COLUMNS = int(360 / CELL_SIZE_DEG)
+
+def normalize_zip(zip_code):
+    if not zip_code:
+        return None
+    digits = zip_code.strip().split('-')[0]
+    if len(digits) < 5 or not digits[:5].isdigit():
+        return None
+    return digits[:5]
+
+@lru_cache(maxsize=1)
+def load_zip_centroids(path=ZIP_CENTROIDS_PATH):
+    centroids = {}
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='') as f:
+        reader = csv.reader(f, delimiter='\t')
+        header = [column.strip() for column in next(reader)]
+        zip_idx, lat_idx, lon_idx = (header.index('GEOID'), header.index('INTPTLAT'), header.index('INTPTLONG'))
+        for row in reader:
+            if not row:
+                continue
+            centroids[row[zip_idx].strip()] = (float(row[lat_idx]), float(row[lon_idx]))
+    return centroids
+
+def geocode_zip(zip_code):
+    zip5 = normalize_zip(zip_code)
+    if zip5 is None:
+        return None
+    return load_zip_centroids().get(zip5)
+
+def geo_cell(latitude, longitude):
+    row = int((latitude + 90) // CELL_SIZE_DEG)
+    col = int((longitude + 180) // CELL_SIZE_DEG) % CELL_COLUMNS
+    return row * CELL_COLUMNS + col
+
+def cells_within(latitude, longitude, radius_miles):
+    lat_delta = radius_miles / MILES_PER_DEGREE_LAT
+    min_lat = max(latitude - lat_delta, -90.0)
+    max_lat = min(latitude + lat_delta, 90.0 - 1e-9)
+    # Longitude degrees shrink towards the poles, so size the box for the
+    # edge of the search area furthest from the equator.
+    widest_lat = min(max(abs(min_lat), abs(max_lat)), 89.0)
+    lon_delta = min(radius_miles / (MILES_PER_DEGREE_LAT * math.cos(math.radians(widest_lat))), 180.0)
+
+    first_row = int((min_lat + 90) // CELL_SIZE_DEG)
+    last_row = int((max_lat + 90) // CELL_SIZE_DEG)
+    first_col = int((longitude - lon_delta + 180) // CELL_SIZE_DEG)
+    last_col = int((longitude + lon_delta + 180) // CELL_SIZE_DEG)
+    cols = {col % CELL_COLUMNS for col in range(first_col, last_col + 1)}
+    return [row * CELL_COLUMNS + col for row in range(first_row, last_row + 1) for col in sorted(cols)]
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+def nearby_donors(query, latitude, longitude, radius_miles, limit=None):
+    """Return donors from ``query`` within ``radius_miles``, closest first.
+
+    Only coordinates of profiles in grid cells overlapping the search box are
+    read; full rows are loaded for the ``limit`` closest matches, each with a
+    ``distance`` attribute in miles.
+    """
+    from models import DonorProfile
+    candidates = query.filter(DonorProfile.geo_cell.in_(cells_within(latitude, longitude, radius_miles)))
+    distances = {}
+    for donor_id, donor_lat, donor_lon in candidates.with_entities(DonorProfile.id, DonorProfile.latitude, DonorProfile.longitude):
+        distance = haversine_miles(latitude, longitude, donor_lat, donor_lon)
+        if distance <= radius_miles:
+            distances[donor_id] = distance
+    closest = sorted(distances, key=distances.get)[:limit]
+    if not closest:
+        return []
+    donors = DonorProfile.query.filter(DonorProfile.id.in_(closest)).all()
+    for donor in donors:
+        donor.distance = distances[donor.id]
+    donors.sort(key=lambda donor: donor.distance)
+    return donors
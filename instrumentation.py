@@ -0,0 +1,202 @@
+import cProfile
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+def _format_labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+def _sample(name, label_text, value):
+    return f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}'
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self._values.items()):
+            yield _sample(self.name, _format_labels(self.labels, labels), value)
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._values.get(labels) or ([0] * (len(self.buckets) + 1), 0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total) in sorted(self._values.items()):
+            label_text = _format_labels(self.labels, labels)
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}'
+            cumulative += counts[-1]
+            yield f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}'
+            yield _sample(f'{self.name}_sum', label_text, total)
+            yield _sample(f'{self.name}_count', label_text, cumulative)
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'sql_time', 'template_time', 'template_started', 'profiler')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_started = None
+        self.profiler = None
+
+def _redact(parameters):
+    """Describe query parameters by type only; values may be personal data."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f'<{len(parameters)} parameter sets>'
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+class Instrumentation:
+    """Opt-in request, SQL and template metrics served at ``/metrics``.
+
+    Nothing is hooked unless ``INSTRUMENTATION`` is set, so a disabled app
+    pays no cost at all. Metrics are kept per process; with several server
+    workers each one reports its own, as with any in-process collector.
+    """
+
+    def __init__(self):
+        self.requests = Histogram('http_request_duration_seconds', 'Request latency by endpoint.',
+                                  ('endpoint', 'method'))
+        self.queries = Histogram('http_request_sql_queries', 'SQL statements issued per request.',
+                                 ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.sql_time = Counter('http_request_sql_seconds_total', 'Time spent in SQL by endpoint.', ('endpoint',))
+        self.template_time = Counter('http_request_template_seconds_total',
+                                     'Time spent rendering templates by endpoint.', ('endpoint',))
+        self.context_processors = Counter('template_context_processor_calls_total',
+                                          'Template context processor invocations.', ('processor',))
+        self.slow_queries = Counter('sql_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS.')
+        self.profiles = Counter('profiles_written_total', 'Sampled cProfile dumps written.', ('endpoint',))
+        self.metrics = (self.requests, self.queries, self.sql_time, self.template_time,
+                        self.context_processors, self.slow_queries, self.profiles)
+
+    def init_app(self, app):
+        """Call after the blueprints are registered."""
+        if not app.config.get('INSTRUMENTATION'):
+            return
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 100) / 1000
+        self.profile_rate = app.config.get('PROFILE_SAMPLE_RATE', 0)
+        self.profile_dir = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        for processors in app.template_context_processors.values():
+            processors[:] = [self._count_calls(processor) for processor in processors]
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def _count_calls(self, processor):
+        name = processor.__name__
+
+        @functools.wraps(processor)
+        def counted():
+            self.context_processors.inc(name)
+            return processor()
+        return counted
+
+    def _before_request(self):
+        stats = g.request_stats = RequestStats()
+        if self.profile_rate and random.random() < self.profile_rate:
+            stats.profiler = cProfile.Profile()
+            stats.profiler.enable()
+
+    def _after_request(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        if stats.profiler is not None:
+            stats.profiler.disable()
+            self._dump_profile(stats.profiler, endpoint)
+        self.requests.observe(time.perf_counter() - stats.started, endpoint, request.method)
+        self.queries.observe(stats.queries, endpoint)
+        self.sql_time.inc(endpoint, amount=stats.sql_time)
+        self.template_time.inc(endpoint, amount=stats.template_time)
+        return response
+
+    def _dump_profile(self, profiler, endpoint):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        profiler.dump_stats(os.path.join(self.profile_dir, f'{endpoint}-{stamp}.prof'))
+        self.profiles.inc(endpoint)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        if has_request_context() and 'request_stats' in g:
+            g.request_stats.queries += 1
+            g.request_stats.sql_time += elapsed
+        if elapsed >= self.slow_query_seconds:
+            self.slow_queries.inc()
+            logger.warning('Slow query (%.1f ms): %s; parameters: %s',
+                           elapsed * 1000, ' '.join(statement.split()), _redact(parameters))
+
+    def _before_render(self, app, template, context):
+        if 'request_stats' in g:
+            g.request_stats.template_started = time.perf_counter()
+
+    def _after_render(self, app, template, context):
+        stats = g.get('request_stats')
+        if stats is not None and stats.template_started is not None:
+            stats.template_time += time.perf_counter() - stats.template_started
+            stats.template_started = None
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+instrumentation = Instrumentation()
@@ -0,0 +1,159 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+
+from app import db
+from cache import TTLCache
+from rollups import record_inventory
+
+# Other workers pick up a write within this many seconds; the writing
+# process sees it immediately.
+INVENTORY_CACHE_TTL = 5
+
+InventoryItem = namedtuple('InventoryItem', ['blood_type', 'quantity_ml', 'last_updated'])
+InventoryState = namedtuple('InventoryState', ['items', 'etag', 'last_modified'])
+
+_state_cache = TTLCache(maxsize=1, ttl=INVENTORY_CACHE_TTL)
+
+class InsufficientInventory(Exception):
+    def __init__(self, blood_type, quantity_ml):
+        super().__init__(f'Insufficient {blood_type} inventory to remove {quantity_ml}ml.')
+        self.blood_type = blood_type
+        self.quantity_ml = quantity_ml
+
+def _apply(blood_type, delta_ml, reason, user_id):
+    from models import BloodInventory, InventoryTransaction
+    # The balance check and the write are one statement, so concurrent workers
+    # can neither lose an update nor take stock below zero.
+    statement = db.update(BloodInventory).where(
+        BloodInventory.blood_type == blood_type,
+        BloodInventory.quantity_ml + delta_ml >= 0,
+    ).values(
+        quantity_ml=BloodInventory.quantity_ml + delta_ml,
+        last_updated=datetime.utcnow(),
+    ).returning(BloodInventory.quantity_ml)
+    balance = db.session.execute(statement).scalar()
+    if balance is None:
+        if delta_ml < 0 or BloodInventory.query.filter_by(blood_type=blood_type).first():
+            raise InsufficientInventory(blood_type, -delta_ml)
+        db.session.add(BloodInventory(blood_type=blood_type, quantity_ml=delta_ml))
+        balance = delta_ml
+    db.session.execute(db.insert(InventoryTransaction).values(
+        blood_type=blood_type, delta_ml=delta_ml, balance_ml=balance,
+        reason=reason, user_id=user_id, created_at=datetime.utcnow(),
+    ))
+    return balance
+
+def adjust_inventory(blood_type, delta_ml, reason, user_id=None):
+    """Atomically add (positive) or remove (negative) stock and record it.
+
+    Returns the new balance. Raises InsufficientInventory, after rolling back,
+    if a removal would take the balance below zero.
+    """
+    return apply_adjustments([(blood_type, delta_ml)], reason, user_id)[blood_type]
+
+def stage_adjustments(adjustments, reason, user_id=None):
+    """Apply ``(blood_type, delta_ml)`` pairs in the current transaction.
+
+    For callers that write other rows alongside; they commit (and then call
+    invalidate_inventory_cache) or roll back themselves.
+    """
+    balances = {}
+    for blood_type, delta_ml in adjustments:
+        balances[blood_type] = _apply(blood_type, delta_ml, reason, user_id)
+    record_inventory(adjustments)
+    return balances
+
+def apply_adjustments(adjustments, reason, user_id=None):
+    """Apply ``(blood_type, delta_ml)`` pairs in a single transaction.
+
+    Either every adjustment is applied or none is. Returns the final balance
+    per blood type touched.
+    """
+    try:
+        balances = stage_adjustments(adjustments, reason, user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_inventory_cache()
+    return balances
+
+def _load_state():
+    from models import BloodInventory
+    items = [InventoryItem(item.blood_type, item.quantity_ml or 0, item.last_updated)
+             for item in BloodInventory.query.order_by(BloodInventory.id)]
+    # Derived from the contents, so every worker computes the same ETag.
+    digest = hashlib.sha1(repr([(item.blood_type, item.quantity_ml) for item in items]).encode()).hexdigest()
+    last_modified = max((item.last_updated for item in items if item.last_updated), default=None)
+    return InventoryState(items, digest[:16], last_modified)
+
+def current_inventory():
+    """Current stock per blood type, served from memory between writes."""
+    return _state_cache.get_or_set('inventory', _load_state)
+
+def invalidate_inventory_cache():
+    _state_cache.clear()
+
+def take_snapshots():
+    """Record the current balance of every blood type against the ledger head.
+
+    Run periodically (``flask inventory snapshot``) so replaying history only
+    has to read entries written since the last snapshot.
+    """
+    from models import BloodInventory, InventorySnapshot, InventoryTransaction
+    snapshots = []
+    for item in BloodInventory.query.all():
+        head = db.session.query(db.func.max(InventoryTransaction.id)).filter(
+            InventoryTransaction.blood_type == item.blood_type).scalar()
+        last = _latest_snapshot(item.blood_type)
+        if head is None or (last and last.transaction_id == head):
+            continue
+        balance = db.session.query(InventoryTransaction.balance_ml).filter_by(id=head).scalar()
+        snapshots.append(InventorySnapshot(blood_type=item.blood_type, quantity_ml=balance, transaction_id=head))
+    db.session.add_all(snapshots)
+    db.session.commit()
+    return snapshots
+
+def _latest_snapshot(blood_type):
+    from models import InventorySnapshot
+    return InventorySnapshot.query.filter_by(blood_type=blood_type).order_by(
+        InventorySnapshot.transaction_id.desc()).first()
+
+def replay_balance(blood_type):
+    """Rebuild a balance from the latest snapshot plus the ledger tail."""
+    from models import InventoryTransaction
+    snapshot = _latest_snapshot(blood_type)
+    start_id, balance = (snapshot.transaction_id, snapshot.quantity_ml) if snapshot else (0, 0)
+    tail = db.session.query(db.func.coalesce(db.func.sum(InventoryTransaction.delta_ml), 0)).filter(
+        InventoryTransaction.blood_type == blood_type, InventoryTransaction.id > start_id).scalar()
+    return balance + tail
+
+def verify_inventory():
+    """Return ``{blood_type: (stored, replayed)}`` for every type that disagrees."""
+    from models import BloodInventory
+    mismatches = {}
+    for item in BloodInventory.query.all():
+        replayed = replay_balance(item.blood_type)
+        if replayed != item.quantity_ml:
+            mismatches[item.blood_type] = (item.quantity_ml, replayed)
+    return mismatches
+
+inventory_cli = AppGroup('inventory', help='Inventory ledger maintenance.')
+
+@inventory_cli.command('snapshot')
+def snapshot_command():
+    snapshots = take_snapshots()
+    click.echo(f'Recorded {len(snapshots)} snapshot(s).')
+
+@inventory_cli.command('verify')
+def verify_command():
+    mismatches = verify_inventory()
+    for blood_type, (stored, replayed) in mismatches.items():
+        click.echo(f'{blood_type}: stored {stored}ml, ledger {replayed}ml')
+    if mismatches:
+        raise SystemExit(1)
+    click.echo('Inventory matches the ledger.')
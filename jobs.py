@@ -0,0 +1,263 @@
+import json
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+
+import click
+from flask import g
+from flask.cli import AppGroup
+from sqlalchemy import event
+
+from app import db
+
+POLL_INTERVAL = 2.0
+# A job still 'running' this long after it started is assumed to belong to a
+# dead worker and is picked up again.
+LEASE = timedelta(minutes=10)
+LATENCY_WINDOW = 1000
+
+_handlers = {}
+_intervals = {}
+
+def job(kind):
+    """Register ``func(ctx)`` as the handler for jobs of ``kind``."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+def recurring(kind, every):
+    """Register ``func(ctx)`` as a job that runs every ``every`` while workers are up.
+
+    Each run queues the next one when it finishes. Two processes starting at
+    once may each queue a run, so the handler must be safe to repeat.
+    """
+    def register(func):
+        _intervals[kind] = every
+        return job(kind)(func)
+    return register
+
+def _schedule(kinds, statuses, delay=None):
+    from models import Job
+    scheduled = {kind for (kind,) in db.session.query(Job.kind).filter(
+        Job.kind.in_(kinds), Job.status.in_(statuses)).distinct()}
+    for kind in kinds:
+        if kind not in scheduled:
+            enqueue(kind, delay=delay)
+
+def schedule_recurring():
+    """Queue a run now of every recurring job that has none queued or running."""
+    if _intervals:
+        _schedule(list(_intervals), ('queued', 'running'))
+        db.session.commit()
+
+class JobContext:
+    def __init__(self, job_id, kind, payload, attempts):
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+
+    def checkpoint(self, **progress):
+        """Save progress with the handler's current transaction.
+
+        Commit right after calling this; a retried job then resumes from the
+        last committed checkpoint instead of repeating finished work.
+        """
+        from models import Job
+        self.payload.update(progress)
+        db.session.execute(db.update(Job).where(Job.id == self.id).values(payload=json.dumps(self.payload)))
+
+def enqueue(kind, payload=None, delay=None, max_attempts=5):
+    """Add a job to the current session; it runs once the session commits."""
+    from models import Job
+    job = Job(kind=kind, payload=json.dumps(payload or {}), max_attempts=max_attempts,
+              run_at=datetime.utcnow() + (delay or timedelta()))
+    db.session.add(job)
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('jobs_enqueued', False):
+        job_queue.wake()
+        try:
+            g.jobs_enqueued = True
+        except RuntimeError:
+            pass
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_jobs(session):
+    session.info.pop('jobs_enqueued', None)
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class JobQueue:
+    """Runs queued jobs on a pool of daemon threads in this process.
+
+    Jobs are claimed with a single conditional UPDATE, so any number of web
+    workers (or ``flask jobs work`` processes) can share the same table. With
+    ``JOBS_INLINE`` set, jobs enqueued during a request run synchronously at
+    the end of it instead, which is what the testing config uses.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._threads = []
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._durations = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {'succeeded': 0, 'retried': 0, 'failed': 0}
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_INLINE', False)
+
+        @app.before_request
+        def _start_job_workers():
+            if not app.config['JOBS_INLINE'] and app.config['JOBS_WORKERS']:
+                self.start()
+
+        @app.after_request
+        def _run_inline_jobs(response):
+            if app.config['JOBS_INLINE'] and g.pop('jobs_enqueued', False):
+                self.drain()
+            return response
+
+    def start(self, workers=None):
+        # Started on the first request rather than in create_app so that
+        # pre-forking servers do not fork with live threads.
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            schedule_recurring()
+            for n in range(workers or self.app.config['JOBS_WORKERS']):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._stopping.clear()
+
+    def wake(self):
+        self._wake.set()
+
+    def _work(self):
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                if not self.run_next():
+                    self._wake.wait(POLL_INTERVAL)
+                    self._wake.clear()
+
+    def _claim(self):
+        from models import Job
+        now = datetime.utcnow()
+        due = db.or_(
+            db.and_(Job.status == 'queued', Job.run_at <= now),
+            db.and_(Job.status == 'running', Job.started_at < now - LEASE),
+        )
+        # The UPDATE repeats the whole predicate: under READ COMMITTED a worker
+        # that waited on another's row lock re-checks it against the claimed
+        # row and backs off. On PostgreSQL, SKIP LOCKED sends it to the next
+        # job instead of waiting; SQLite ignores it and serializes writers.
+        candidate = db.select(Job.id).where(due).order_by(Job.run_at, Job.id).limit(1).with_for_update(
+            skip_locked=True).scalar_subquery()
+        claimed = db.session.execute(db.update(Job).where(Job.id == candidate, due).values(
+            status='running', started_at=now, attempts=Job.attempts + 1,
+        ).returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.run_at)).first()
+        db.session.commit()
+        return claimed
+
+    def run_next(self):
+        """Claim and run one due job. Returns False when none is due."""
+        from models import Job
+        claimed = self._claim()
+        if claimed is None:
+            return False
+        started = time.monotonic()
+        self._latencies.append((datetime.utcnow() - claimed.run_at).total_seconds())
+        ctx = JobContext(claimed.id, claimed.kind, json.loads(claimed.payload), claimed.attempts)
+        try:
+            _handlers[claimed.kind](ctx)
+            db.session.commit()
+            values = {'status': 'done', 'finished_at': datetime.utcnow(), 'last_error': None}
+            self.counters['succeeded'] += 1
+        except Exception:
+            db.session.rollback()
+            error = traceback.format_exc(limit=5)
+            self.app.logger.error(f'Job {claimed.id} ({claimed.kind}) failed: {error}')
+            if claimed.attempts < claimed.max_attempts:
+                values = {'status': 'queued', 'last_error': error,
+                          'run_at': datetime.utcnow() + timedelta(seconds=2 ** claimed.attempts)}
+                self.counters['retried'] += 1
+            else:
+                values = {'status': 'failed', 'last_error': error, 'finished_at': datetime.utcnow()}
+                self.counters['failed'] += 1
+        db.session.execute(db.update(Job).where(Job.id == claimed.id).values(**values))
+        if claimed.kind in _intervals and values['status'] != 'queued':
+            _schedule([claimed.kind], ('queued',), _intervals[claimed.kind])
+        db.session.commit()
+        self._durations.append(time.monotonic() - started)
+        return True
+
+    def drain(self):
+        """Run due jobs in the calling thread until none are left."""
+        while self.run_next():
+            pass
+
+    def stats(self):
+        from models import Job
+        depth = dict(db.session.query(Job.status, db.func.count()).filter(
+            Job.status.in_(('queued', 'running'))).group_by(Job.status).all())
+        # Only jobs already due; recurring jobs always have a later run queued.
+        oldest = db.session.query(db.func.min(Job.run_at)).filter(
+            Job.status == 'queued', Job.run_at <= datetime.utcnow()).scalar()
+        latencies, durations = list(self._latencies), list(self._durations)
+        return {
+            'queued': depth.get('queued', 0),
+            'running': depth.get('running', 0),
+            'oldest_queued_seconds': (datetime.utcnow() - oldest).total_seconds() if oldest else 0,
+            'workers': len(self._threads),
+            'queue_latency_p50': _percentile(latencies, 0.5),
+            'queue_latency_p95': _percentile(latencies, 0.95),
+            'run_time_p50': _percentile(durations, 0.5),
+            'run_time_p95': _percentile(durations, 0.95),
+            **self.counters,
+        }
+
+job_queue = JobQueue()
+
+jobs_cli = AppGroup('jobs', help='Background job queue.')
+
+@jobs_cli.command('work')
+@click.option('--workers', default=2, show_default=True)
+def work_command(workers):
+    """Run job workers in the foreground."""
+    job_queue.start(workers)
+    click.echo(f'Running {workers} job worker(s); Ctrl+C to stop.')
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        job_queue.stop()
+
+@jobs_cli.command('stats')
+def stats_command():
+    for key, value in job_queue.stats().items():
+        click.echo(f'{key}: {value}')
@@ -0,0 +1,105 @@
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+FTS_TABLE = 'donor_location_fts'
+AUTOCOMPLETE_LIMIT = 10
+
+_fts_available = WeakKeyDictionary()
+
+def normalize_location(value):
+    """Case-folded, trimmed, single-spaced form stored in the *_norm columns."""
+    if value is None:
+        return None
+    return ' '.join(value.split()).casefold() or None
+
+def _prefix_range(column, prefix):
+    # A half-open range instead of LIKE 'x%' so any B-tree index on the
+    # normalized column applies, whatever the collation or database.
+    return db.and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+def has_location_index():
+    engine = db.engine
+    if engine not in _fts_available:
+        _fts_available[engine] = engine.dialect.name == 'sqlite' and inspect(engine).has_table(FTS_TABLE)
+    return _fts_available[engine]
+
+def location_filter(field, term):
+    """Filter expression matching donors whose city/state contains ``term``.
+
+    Terms of three or more characters are looked up in the trigram FTS5 index
+    where it exists; shorter terms fall back to an indexed prefix match. LIKE
+    wildcards are dropped from the term rather than escaped, because FTS5
+    only serves a LIKE without an ESCAPE clause from the index.
+    """
+    from models import DonorProfile
+    column = {'city': DonorProfile.city_norm, 'state': DonorProfile.state_norm}[field]
+    term = normalize_location((term or '').replace('%', ' ').replace('_', ' '))
+    if not term:
+        return db.true()
+    if len(term) < 3:
+        return _prefix_range(column, term)
+    pattern = f'%{term}%'
+    if has_location_index():
+        matching_ids = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {column.key} LIKE :pattern").bindparams(
+            pattern=pattern).columns(rowid=db.Integer)
+        return DonorProfile.id.in_(matching_ids)
+    return column.like(pattern)
+
+def autocomplete(field, prefix, state=None, limit=AUTOCOMPLETE_LIMIT):
+    """Distinct city or state values starting with ``prefix``, most donors first."""
+    from models import DonorProfile
+    prefix = normalize_location(prefix)
+    if not prefix:
+        return []
+    donors = db.func.count().label('donors')
+    if field == 'state':
+        rows = db.session.query(db.func.min(DonorProfile.state), donors).filter(
+            _prefix_range(DonorProfile.state_norm, prefix)).group_by(DonorProfile.state_norm) \
+            .order_by(donors.desc()).limit(limit)
+        return [{'value': ' '.join(value.split()), 'donors': count} for value, count in rows]
+
+    query = db.session.query(db.func.min(DonorProfile.city), db.func.min(DonorProfile.state), donors).filter(
+        _prefix_range(DonorProfile.city_norm, prefix))
+    if normalize_location(state):
+        query = query.filter(DonorProfile.state_norm == normalize_location(state))
+    rows = query.group_by(DonorProfile.city_norm, DonorProfile.state_norm).order_by(donors.desc()).limit(limit)
+    return [{'value': ' '.join(value.split()), 'state': ' '.join(state_value.split()), 'donors': count}
+            for value, state_value, count in rows]
+
+def create_location_index():
+    """Create the trigram FTS5 index over donor locations (SQLite only).
+
+    Triggers keep it in step with donor_profile, so nothing else has to write
+    to it. Skipped when the SQLite build has no trigram tokenizer.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    statements = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            city_norm, state_norm, content='donor_profile', content_rowid='id', tokenize='trigram')""",
+        f"""CREATE TRIGGER IF NOT EXISTS donor_location_ai AFTER INSERT ON donor_profile BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, city_norm, state_norm) VALUES (new.id, new.city_norm, new.state_norm);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS donor_location_ad AFTER DELETE ON donor_profile BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, city_norm, state_norm)
+            VALUES ('delete', old.id, old.city_norm, old.state_norm);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS donor_location_au AFTER UPDATE OF city_norm, state_norm ON donor_profile BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, city_norm, state_norm)
+            VALUES ('delete', old.id, old.city_norm, old.state_norm);
+            INSERT INTO {FTS_TABLE}(rowid, city_norm, state_norm) VALUES (new.id, new.city_norm, new.state_norm);
+        END""",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+    try:
+        with db.engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+    except OperationalError:
+        return False
+    _fts_available.pop(db.engine, None)
+    return True
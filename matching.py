@@ -0,0 +1,125 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from app import db
+
+# Same order init_blood_inventory seeds; bit i stands for BLOOD_TYPES[i].
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+TYPE_BIT = {blood_type: 1 << i for i, blood_type in enumerate(BLOOD_TYPES)}
+
+DONATION_INTERVAL = timedelta(days=56)
+DONORS_PER_REQUEST = 20
+
+def _antigens(blood_type):
+    abo = blood_type[:-1]
+    return set() if abo == 'O' else set(abo), blood_type.endswith('+')
+
+def _build_compatibility():
+    can_receive = {}
+    for recipient in BLOOD_TYPES:
+        r_abo, r_rh = _antigens(recipient)
+        mask = 0
+        for donor in BLOOD_TYPES:
+            d_abo, d_rh = _antigens(donor)
+            if d_abo <= r_abo and (r_rh or not d_rh):
+                mask |= TYPE_BIT[donor]
+        can_receive[recipient] = mask
+    can_give = {donor: sum(TYPE_BIT[r] for r in BLOOD_TYPES if can_receive[r] & TYPE_BIT[donor])
+                for donor in BLOOD_TYPES}
+    return can_receive, can_give
+
+# CAN_RECEIVE[recipient] -> mask of donor types; CAN_GIVE[donor] -> mask of recipient types.
+CAN_RECEIVE, CAN_GIVE = _build_compatibility()
+
+def types_in(mask):
+    return [blood_type for blood_type in BLOOD_TYPES if mask & TYPE_BIT[blood_type]]
+
+def compatible_donor_types(recipient_type):
+    """Donor types a recipient can take, best first.
+
+    The exact type comes first, then types that serve the fewest other
+    recipients so universal donors (O-) are kept for when nothing else fits.
+    """
+    def rank(donor_type):
+        return (donor_type != recipient_type, bin(CAN_GIVE[donor_type]).count('1'))
+    return sorted(types_in(CAN_RECEIVE[recipient_type]), key=rank)
+
+RequestMatch = namedtuple('RequestMatch', ['request', 'allocation', 'donors', 'shortfall_ml'])
+
+def _priority(blood_request):
+    return (not blood_request.emergency, blood_request.created_at or datetime.min, blood_request.id)
+
+def _load_donors(blood_types, per_type, now):
+    from models import DonorProfile
+    eligible_before = now - DONATION_INTERVAL
+    # One LIMITed branch per type, each a bounded walk of ix_donor_profile_match,
+    # combined into a single statement.
+    per_type_ids = [
+        db.select(DonorProfile.id).where(
+            DonorProfile.blood_type == blood_type,
+            DonorProfile.availability_status == 'available',
+            db.or_(DonorProfile.last_donation.is_(None), DonorProfile.last_donation <= eligible_before),
+        ).order_by(DonorProfile.last_donation.asc().nulls_first(), DonorProfile.id).limit(per_type).subquery()
+        for blood_type in blood_types
+    ]
+    ids = db.union_all(*[db.select(subquery.c.id) for subquery in per_type_ids])
+    donors = DonorProfile.query.filter(DonorProfile.id.in_(ids)).order_by(
+        DonorProfile.last_donation.asc().nulls_first(), DonorProfile.id).all()
+    by_type = {blood_type: [] for blood_type in blood_types}
+    for donor in donors:
+        by_type[donor.blood_type].append(donor)
+    return by_type
+
+def match_requests(blood_requests, donors_per_request=DONORS_PER_REQUEST, now=None):
+    """Match a batch of requests against inventory and eligible donors.
+
+    Requests are served in priority order (emergency, then oldest) and
+    inventory is drawn down as it is allocated so later requests in the batch
+    only see what is left. The database is read, never written: two queries
+    are issued regardless of the batch size.
+    """
+    from models import BloodInventory
+    now = now or datetime.utcnow()
+    blood_requests = sorted(blood_requests, key=_priority)
+    if not blood_requests:
+        return []
+
+    needed_mask = 0
+    for blood_request in blood_requests:
+        needed_mask |= CAN_RECEIVE[blood_request.blood_type]
+    needed_types = types_in(needed_mask)
+
+    remaining = {item.blood_type: item.quantity_ml or 0
+                 for item in BloodInventory.query.filter(BloodInventory.blood_type.in_(needed_types))}
+    donors_by_type = _load_donors(needed_types, donors_per_request, now)
+
+    matches = []
+    for blood_request in blood_requests:
+        donor_types = compatible_donor_types(blood_request.blood_type)
+        still_needed = blood_request.quantity_ml
+        allocation = []
+        for donor_type in donor_types:
+            if still_needed <= 0:
+                break
+            take = min(remaining.get(donor_type, 0), still_needed)
+            if take > 0:
+                allocation.append((donor_type, take))
+                remaining[donor_type] -= take
+                still_needed -= take
+        donors = []
+        for donor_type in donor_types:
+            donors.extend(donors_by_type[donor_type][:donors_per_request - len(donors)])
+            if len(donors) >= donors_per_request:
+                break
+        matches.append(RequestMatch(blood_request, allocation, donors, max(still_needed, 0)))
+    return matches
+
+def match_request(blood_request, donors_per_request=DONORS_PER_REQUEST):
+    return match_requests([blood_request], donors_per_request)[0]
+
+def match_pending_requests(limit=None, donors_per_request=DONORS_PER_REQUEST):
+    from models import BloodRequest
+    query = BloodRequest.query.filter_by(status='pending').order_by(BloodRequest.emergency.desc(), BloodRequest.created_at)
+    if limit:
+        query = query.limit(limit)
+    return match_requests(query.all(), donors_per_request)
@@ -0,0 +1,190 @@
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False),
+)
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+# Postgres advisory lock key shared by every process running upgrade().
+MIGRATION_LOCK_KEY = 72_001_006
+BACKFILL_BATCH = 5000
+
+def init_blood_inventory():
+    from models import BloodInventory
+    existing = {blood_type for (blood_type,) in db.session.query(BloodInventory.blood_type)}
+    db.session.add_all(BloodInventory(blood_type=blood_type, quantity_ml=0)
+                       for blood_type in BLOOD_TYPES if blood_type not in existing)
+    db.session.commit()
+
+def _add_column(table, column, ddl_type):
+    columns = {c['name'] for c in inspect(db.engine).get_columns(table)}
+    if column not in columns:
+        with db.engine.begin() as conn:
+            table = db.engine.dialect.identifier_preparer.quote(table)
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl_type}'))
+
+def _create_tables():
+    # Only the primary; a read replica gets its schema by replication.
+    db.create_all(bind_key=None)
+
+def _create_indexes():
+    # Indexes on columns a later migration adds are left for that migration.
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if all(column.name in existing for column in index.columns):
+                index.create(db.engine, checkfirst=True)
+
+def _create_tables_and_indexes():
+    db.create_all(bind_key=None)
+    _create_indexes()
+
+def _donor_geo_cell():
+    _add_column('donor_profile', 'geo_cell', 'INTEGER')
+    _create_indexes()
+
+def _donor_coordinates():
+    # Donors stored before geocoding have a ZIP code but no coordinates, so
+    # radius search cannot find them until they are filled in here.
+    from models import DonorProfile
+    from geo import geo_cell, geocode_zip
+    table = DonorProfile.__table__
+    backfill = table.update().where(table.c.id == db.bindparam('row_id')).values(
+        latitude=db.bindparam('latitude_value'), longitude=db.bindparam('longitude_value'),
+        geo_cell=db.bindparam('cell_value'))
+    last_id = 0
+    while True:
+        rows = db.session.execute(db.select(table.c.id, table.c.zip_code, table.c.latitude, table.c.longitude).where(
+            table.c.id > last_id, table.c.geo_cell.is_(None)).order_by(table.c.id).limit(BACKFILL_BATCH)).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            if row.latitude is not None and row.longitude is not None:
+                coordinates = (row.latitude, row.longitude)
+            else:
+                coordinates = geocode_zip(row.zip_code)
+            if coordinates:
+                updates.append({'row_id': row.id, 'latitude_value': coordinates[0],
+                                'longitude_value': coordinates[1], 'cell_value': geo_cell(*coordinates)})
+        if updates:
+            db.session.execute(backfill, updates)
+        db.session.commit()
+        last_id = rows[-1].id
+
+def _user_session_version():
+    _add_column('user', 'session_version', 'INTEGER NOT NULL DEFAULT 0')
+
+def _donation_sites():
+    from models import DonationSite
+    db.create_all(bind_key=None)
+    _add_column('donation_schedule', 'site_id', 'INTEGER REFERENCES donation_site(id)')
+    _create_indexes()
+    if not db.session.query(DonationSite.id).first():
+        db.session.add(DonationSite(name='Main Donation Center', daily_capacity=50))
+        db.session.commit()
+
+def _activity_rollups():
+    from rollups import rebuild
+    db.create_all(bind_key=None)
+    rebuild()
+
+def _donor_location_norm():
+    from models import DonorProfile
+    from locations import create_location_index, normalize_location
+    _add_column('donor_profile', 'city_norm', 'VARCHAR(100)')
+    _add_column('donor_profile', 'state_norm', 'VARCHAR(50)')
+    table = DonorProfile.__table__
+    backfill = table.update().where(table.c.id == db.bindparam('row_id')).values(
+        city_norm=db.bindparam('city_value'), state_norm=db.bindparam('state_value'))
+    last_id = 0
+    while True:
+        rows = db.session.execute(db.select(table.c.id, table.c.city, table.c.state).where(
+            table.c.id > last_id).order_by(table.c.id).limit(BACKFILL_BATCH)).all()
+        if not rows:
+            break
+        db.session.execute(backfill, [
+            {'row_id': row.id, 'city_value': normalize_location(row.city), 'state_value': normalize_location(row.state)}
+            for row in rows
+        ])
+        db.session.commit()
+        last_id = rows[-1].id
+    _create_indexes()
+    create_location_index()
+
+# Append only. Every step must be safe to re-run: tables and indexes are
+# created with checkfirst and columns are only added when missing.
+MIGRATIONS = [
+    (1, 'create tables', _create_tables),
+    (2, 'seed blood inventory', init_blood_inventory),
+    (3, 'donor_profile.geo_cell spatial bucket', _donor_geo_cell),
+    (4, 'query indexes', _create_indexes),
+    (5, 'normalized donor locations and location search index', _donor_location_norm),
+    (6, 'background job table', _create_tables_and_indexes),
+    (7, 'user.session_version session stamp', _user_session_version),
+    (8, 'donation sites, daily slots and eligibility index', _donation_sites),
+    (9, 'daily and weekly activity rollups, backfilled', _activity_rollups),
+    (10, 'blood units with expiry', _create_tables_and_indexes),
+    (11, 'triage queue index', _create_indexes),
+    (12, 'donor coordinates backfilled from ZIP codes', _donor_coordinates),
+    (13, 'notification inbox index', _create_indexes),
+]
+
+def current_version():
+    if not inspect(db.engine).has_table('schema_version'):
+        return 0
+    return db.session.query(db.func.max(schema_version.c.version)).scalar() or 0
+
+def upgrade():
+    """Apply pending migrations and return the resulting schema version."""
+    lock = None
+    if db.engine.dialect.name == 'postgresql':
+        lock = db.engine.connect()
+        lock.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+    try:
+        schema_version.create(db.engine, checkfirst=True)
+        applied = current_version()
+        for version, description, step in MIGRATIONS:
+            if version <= applied:
+                continue
+            step()
+            try:
+                db.session.execute(schema_version.insert().values(
+                    version=version, description=description, applied_at=datetime.utcnow()))
+                db.session.commit()
+            except IntegrityError:
+                # Another process recorded the same (idempotent) step first.
+                db.session.rollback()
+        return current_version()
+    finally:
+        if lock is not None:
+            lock.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            lock.close()
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Bring the database schema up to date."""
+    before = current_version()
+    after = upgrade()
+    click.echo(f'Schema at version {after} (was {before}).')
+
+@click.command('schema-version')
+@with_appcontext
+def schema_version_command():
+    """Show the applied and latest schema versions."""
+    click.echo(f'Applied: {current_version()}, latest: {MIGRATIONS[-1][0]}')
@@ -1,11 +1,49 @@
 from datetime import datetime, timedelta
-from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import session
+from flask_login import UserMixin, user_logged_in
 from app import db, login_manager
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached, validates
+from cache import TTLCache
+from geo import geo_cell
+from locations import normalize_location
+from passwords import hash_password, needs_rehash, verify_password
+
+# Column values of recently seen users, so authenticated requests can rebuild
+# current_user without a query. Other processes only see a change once the
+# entry expires; the session stamp below catches role and password changes.
+_identities = TTLCache(maxsize=10000, ttl=30)
+
+def _identity_stamp(values):
+    return [values['role'], values['session_version']]
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    stamp = session.get('_identity')
+    values = _identities.get(user_id)
+    if values is None or (stamp is not None and stamp != _identity_stamp(values)):
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        values = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+        _identities.set(user_id, values)
+    else:
+        user = User(**values)
+        make_transient_to_detached(user)
+        user = db.session.merge(user, load=False)
+    if stamp is None:
+        session['_identity'] = _identity_stamp(values)
+    elif stamp != _identity_stamp(values):
+        # The role changed or the password was reset since this login.
+        session.pop('_user_id', None)
+        session.pop('_identity', None)
+        return None
+    return user
+
+@user_logged_in.connect
+def _stamp_session(app, user, **extra):
+    session['_identity'] = [user.role, user.session_version]
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,6 +52,13 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(256))
     role = db.Column(db.String(20), nullable=False)  # donor, recipient, admin
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped when the password is set; sessions stamped with an older value end.
+    session_version = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_user_created', 'created_at', 'id'),
+        db.Index('ix_user_role_created', 'role', 'created_at', 'id'),
+    )
 
     # Relationships
     donor_profile = db.relationship('DonorProfile', backref='user', uselist=False)
@@ -21,12 +66,30 @@ class User(UserMixin, db.Model):
     donation_schedules = db.relationship('DonationSchedule', backref='donor', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
+        self.session_version = (self.session_version or 0) + 1
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify ``password``, upgrading a hash made with an old cost setting.
+
+        An upgraded hash is left on the session for the caller to commit.
+        """
+        if not self.password_hash or not verify_password(self.password_hash, password):
+            return False
+        if needs_rehash(self.password_hash):
+            self.password_hash = hash_password(password)
+        return True
 
 class DonorProfile(db.Model):
+    __table_args__ = (
+        db.Index('ix_donor_profile_match', 'blood_type', 'availability_status', 'last_donation'),
+        db.Index('ix_donor_profile_type_status_zip', 'blood_type', 'availability_status', 'zip_code'),
+        db.Index('ix_donor_profile_zip', 'zip_code'),
+        db.Index('ix_donor_profile_city_state', 'city_norm', 'state_norm'),
+        db.Index('ix_donor_profile_state_city', 'state_norm', 'city_norm'),
+        db.Index('ix_donor_profile_type_last_donation', 'blood_type', 'last_donation'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     blood_type = db.Column(db.String(5), nullable=False)
@@ -39,10 +102,24 @@ class DonorProfile(db.Model):
     city = db.Column(db.String(100))
     state = db.Column(db.String(50))
     zip_code = db.Column(db.String(10))
+    # Case-folded copies of city/state for indexed search, see locations.py
+    city_norm = db.Column(db.String(100))
+    state_norm = db.Column(db.String(50))
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
+    geo_cell = db.Column(db.Integer, index=True)  # spatial grid bucket, see geo.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @validates('city', 'state')
+    def _normalize_location(self, key, value):
+        setattr(self, f'{key}_norm', normalize_location(value))
+        return value
+
+    def set_coordinates(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.geo_cell = geo_cell(latitude, longitude) if latitude is not None and longitude is not None else None
+
 class BloodInventory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     blood_type = db.Column(db.String(5), nullable=False)
@@ -50,6 +127,15 @@ class BloodInventory(db.Model):
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
 
 class BloodRequest(db.Model):
+    __table_args__ = (
+        db.Index('ix_blood_request_created', 'created_at', 'id'),
+        db.Index('ix_blood_request_status_created', 'status', 'created_at', 'id'),
+        db.Index('ix_blood_request_emergency_created', 'emergency', 'created_at', 'id'),
+        # The triage queue: pending requests, emergencies first, oldest first.
+        db.Index('ix_blood_request_status_emergency_created', 'status', 'emergency', 'created_at', 'id'),
+        db.Index('ix_blood_request_type_created', 'blood_type', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     blood_type = db.Column(db.String(5), nullable=False)
@@ -62,6 +148,11 @@ class BloodRequest(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index('ix_notification_user_read_created', 'user_id', 'read', 'created_at'),
+        db.Index('ix_notification_user_created', 'user_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
@@ -69,8 +160,130 @@ class Notification(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class DonationSchedule(db.Model):
+    __table_args__ = (
+        db.Index('ix_donation_schedule_status_date', 'status', 'scheduled_date'),
+        db.Index('ix_donation_schedule_donor_status', 'donor_id', 'status'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     donor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    site_id = db.Column(db.Integer, db.ForeignKey('donation_site.id'))
     scheduled_date = db.Column(db.DateTime, nullable=False)
-    status = db.Column(db.String(20), default='scheduled')  # scheduled, completed, cancelled
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    status = db.Column(db.String(20), default='scheduled')  # scheduled, checked_in, completed, no_show, cancelled
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    site = db.relationship('DonationSite')
+
+class DonationSite(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    city = db.Column(db.String(100))
+    state = db.Column(db.String(50))
+    daily_capacity = db.Column(db.Integer, nullable=False, default=50)  # bookings per day
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DonationSlot(db.Model):
+    # Bookings taken per site and day, see scheduling.py. Capacity starts at
+    # the site's daily_capacity and can be changed for individual days.
+    __table_args__ = (
+        db.UniqueConstraint('site_id', 'day', name='uq_donation_slot_site_day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    site_id = db.Column(db.Integer, db.ForeignKey('donation_site.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+
+class InventoryTransaction(db.Model):
+    # Append-only ledger; BloodInventory.quantity_ml is its running total.
+    __table_args__ = (
+        db.Index('ix_inventory_transaction_type_id', 'blood_type', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    blood_type = db.Column(db.String(5), nullable=False)
+    delta_ml = db.Column(db.Integer, nullable=False)
+    balance_ml = db.Column(db.Integer, nullable=False)  # balance after this entry
+    reason = db.Column(db.String(50), nullable=False)  # add, remove, bulk, ...
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class BloodUnit(db.Model):
+    # One collected bag, see units.py. Available units are part of
+    # BloodInventory.quantity_ml; allocation and expiry go through the ledger.
+    __table_args__ = (
+        db.Index('ix_blood_unit_type_status_expires', 'blood_type', 'status', 'expires_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    blood_type = db.Column(db.String(5), nullable=False)
+    volume_ml = db.Column(db.Integer, nullable=False, default=450)
+    donation_id = db.Column(db.Integer, db.ForeignKey('donation_schedule.id'))
+    collected_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='available')  # available, allocated, expired
+    request_id = db.Column(db.Integer, db.ForeignKey('blood_request.id'))
+    allocated_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class InventorySnapshot(db.Model):
+    __table_args__ = (
+        db.Index('ix_inventory_snapshot_type_txn', 'blood_type', 'transaction_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    blood_type = db.Column(db.String(5), nullable=False)
+    quantity_ml = db.Column(db.Integer, nullable=False)
+    transaction_id = db.Column(db.Integer, nullable=False)  # last ledger entry included
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailyRollup(db.Model):
+    # Pre-aggregated activity for the trends API, kept current by rollups.py
+    metric = db.Column(db.String(20), primary_key=True)  # requests, donations, inventory
+    day = db.Column(db.Date, primary_key=True)
+    blood_type = db.Column(db.String(5), primary_key=True)  # '' when unknown
+    status = db.Column(db.String(20), primary_key=True)  # request or booking status; in/out for inventory
+    count = db.Column(db.Integer, nullable=False, default=0)
+    quantity_ml = db.Column(db.Integer, nullable=False, default=0)
+
+class WeeklyRollup(db.Model):
+    # DailyRollup summed per week; ``week`` is the Monday it starts on
+    metric = db.Column(db.String(20), primary_key=True)
+    week = db.Column(db.Date, primary_key=True)
+    blood_type = db.Column(db.String(5), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    quantity_ml = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    # Durable background work, see jobs.py
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    last_error = db.Column(db.Text)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('changed_users', set())
+    changed.update(obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User))
+
+@event.listens_for(db.session, 'after_commit')
+def _forget_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        _identities.delete(user_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_users', None)
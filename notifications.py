@@ -0,0 +1,138 @@
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import db
+from cache import TTLCache
+from jobs import job
+
+SUMMARY_SIZE = 5
+HEADLINE_LENGTH = 80
+FANOUT_BATCH = 2000
+
+Headline = namedtuple('Headline', ['id', 'text', 'created_at'])
+NotificationSummary = namedtuple('NotificationSummary', ['unread', 'latest'])
+
+_summaries = TTLCache(maxsize=10000, ttl=30)
+
+def _headline(notification):
+    text = notification.message
+    if len(text) > HEADLINE_LENGTH:
+        text = text[:HEADLINE_LENGTH - 1].rstrip() + '…'
+    return Headline(notification.id, text, notification.created_at)
+
+def _load_summary(user_id):
+    from models import Notification
+    unread = Notification.query.filter_by(user_id=user_id, read=False)
+    count = unread.count()
+    latest = []
+    if count:
+        rows = unread.with_entities(Notification.id, Notification.message, Notification.created_at).order_by(
+            Notification.created_at.desc(), Notification.id.desc()).limit(SUMMARY_SIZE)
+        latest = [_headline(row) for row in rows]
+    return NotificationSummary(count, latest)
+
+def notification_summary(user_id):
+    return _summaries.get_or_set(user_id, lambda: _load_summary(user_id))
+
+def invalidate_summary(user_id):
+    _summaries.delete(user_id)
+
+def notify(user_id, message):
+    """Queue a notification on the current session.
+
+    The cached summary for the user is updated once the session commits.
+    """
+    from models import Notification
+    notification = Notification(user_id=user_id, message=message)
+    db.session.add(notification)
+    db.session.info.setdefault('new_notifications', []).append(notification)
+    return notification
+
+def notify_many(messages):
+    """Bulk-insert ``(user_id, message)`` notifications in the current transaction.
+
+    The recipients' cached summaries are dropped once the session commits.
+    """
+    from models import Notification
+    if not messages:
+        return
+    now = datetime.utcnow()
+    db.session.execute(Notification.__table__.insert(), [
+        {'user_id': user_id, 'message': message, 'read': False, 'created_at': now} for user_id, message in messages
+    ])
+    db.session.info.setdefault('stale_summaries', set()).update(user_id for user_id, _ in messages)
+
+def _prepend(headline):
+    def apply(summary):
+        return NotificationSummary(summary.unread + 1, ([headline] + summary.latest)[:SUMMARY_SIZE])
+    return apply
+
+@event.listens_for(db.session, 'after_flush')
+def _capture_new_notifications(session, flush_context):
+    # Headlines are built here, while ids are fresh and attributes are not yet
+    # expired by the commit.
+    flushed = session.info.pop('new_notifications', [])
+    session.info.setdefault('new_headlines', []).extend(
+        (notification.user_id, _headline(notification)) for notification in flushed)
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_new_notifications(session):
+    for user_id, headline in session.info.pop('new_headlines', []):
+        _summaries.update(user_id, _prepend(headline))
+    for user_id in session.info.pop('stale_summaries', ()):
+        invalidate_summary(user_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_new_notifications(session):
+    session.info.pop('new_notifications', None)
+    session.info.pop('new_headlines', None)
+    session.info.pop('stale_summaries', None)
+
+def mark_read(user_id, notification_ids=None):
+    """Mark the given notifications (or all of them) read in one UPDATE."""
+    from models import Notification
+    query = Notification.query.filter(Notification.user_id == user_id, Notification.read.is_(False))
+    if notification_ids is not None:
+        query = query.filter(Notification.id.in_(notification_ids))
+    updated = query.update({Notification.read: True}, synchronize_session=False)
+    db.session.commit()
+    invalidate_summary(user_id)
+    return updated
+
+@job('emergency_fanout')
+def emergency_fanout(ctx):
+    """Alert every eligible donor who can give to an emergency request.
+
+    Donors are walked in id order, ``FANOUT_BATCH`` at a time. Each batch of
+    notifications commits together with the job's checkpoint, so a retry
+    carries on after the last donor already alerted.
+    """
+    from matching import CAN_RECEIVE, DONATION_INTERVAL, types_in
+    from models import BloodRequest, DonorProfile, Notification
+    blood_request = db.session.get(BloodRequest, ctx.payload['request_id'])
+    if blood_request is None or blood_request.status != 'pending':
+        return
+    message = (f'Emergency: {blood_request.blood_type} blood is urgently needed at '
+               f'{blood_request.hospital_name}. Please schedule a donation if you can.')
+    eligible_before = datetime.utcnow() - DONATION_INTERVAL
+    last_id = ctx.payload.get('last_donor_id', 0)
+    while True:
+        donors = db.session.execute(db.select(DonorProfile.id, DonorProfile.user_id).where(
+            DonorProfile.id > last_id,
+            DonorProfile.blood_type.in_(types_in(CAN_RECEIVE[blood_request.blood_type])),
+            DonorProfile.availability_status == 'available',
+            db.or_(DonorProfile.last_donation.is_(None), DonorProfile.last_donation <= eligible_before),
+        ).order_by(DonorProfile.id).limit(FANOUT_BATCH)).all()
+        if not donors:
+            break
+        now = datetime.utcnow()
+        db.session.execute(Notification.__table__.insert(), [
+            {'user_id': row.user_id, 'message': message, 'read': False, 'created_at': now} for row in donors
+        ])
+        last_id = donors[-1].id
+        ctx.checkpoint(last_donor_id=last_id, notified=ctx.payload.get('notified', 0) + len(donors))
+        db.session.commit()
+        for row in donors:
+            invalidate_summary(row.user_id)
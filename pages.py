@@ -0,0 +1,152 @@
+import functools
+import gzip
+import hashlib
+import mimetypes
+import os
+from collections import namedtuple
+
+from flask import current_app, request, session, url_for
+from markupsafe import Markup
+from werkzeug.wrappers import Response
+
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone is fine
+    brotli = None
+
+# A rendered body with its precompressed variants (None when not worth it).
+Page = namedtuple('Page', ['body', 'gzip', 'br', 'etag', 'mimetype'])
+
+COMPRESS_MIN_BYTES = 512
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+_fragments = TTLCache(maxsize=512, ttl=3600)
+
+def build_page(body, mimetype='text/html'):
+    if isinstance(body, str):
+        body = body.encode()
+    etag = hashlib.sha256(body).hexdigest()[:16]
+    if len(body) < COMPRESS_MIN_BYTES or not mimetype.startswith(COMPRESSIBLE):
+        return Page(body, None, None, etag, mimetype)
+    return Page(body, gzip.compress(body, 9, mtime=0), brotli.compress(body) if brotli else None, etag, mimetype)
+
+def respond(page, max_age=None):
+    """A response for ``page`` in the best encoding the client accepts.
+
+    Clients revalidate with the ETag unless ``max_age`` is given.
+    """
+    encodings = request.accept_encodings
+    if page.br and 'br' in encodings:
+        body, encoding = page.br, 'br'
+    elif page.gzip and 'gzip' in encodings:
+        body, encoding = page.gzip, 'gzip'
+    else:
+        body, encoding = page.body, None
+    response = Response(body, mimetype=page.mimetype)
+    if encoding:
+        response.content_encoding = encoding
+    # Each encoding is a different representation, so gets its own tag.
+    response.set_etag(f'{page.etag}-{encoding}' if encoding else page.etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    if max_age:
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def is_anonymous_request():
+    """True when nothing about the response can depend on who is asking."""
+    return ('_user_id' not in session and not session.get('_flashes')
+            and current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token') not in request.cookies)
+
+def prerendered(view):
+    """Serve anonymous visitors the copy of this page rendered by ``init_app``.
+
+    The view must not take arguments or depend on anything but the template.
+    """
+    @functools.wraps(view)
+    def wrapper():
+        page = current_app.extensions['pages'].get(request.endpoint)
+        if page is not None and is_anonymous_request():
+            response = respond(page)
+            response.vary.add('Cookie')
+            return response
+        return view()
+    wrapper.prerender = True
+    return wrapper
+
+def cached_fragment(name, *key, caller):
+    """Jinja call block that renders its body once per ``(name, key)``.
+
+    Put whatever the body depends on (role, a data version such as the
+    inventory ETag) in ``key``; a new version is simply a new entry, and the
+    old one ages out of the cache.
+    """
+    if not current_app.config.get('PAGE_CACHE'):
+        return caller()
+    cache_key = (name,) + key
+    html = _fragments.get(cache_key)
+    if html is None:
+        html = Markup(caller())
+        _fragments.set(cache_key, html)
+    return html
+
+def _load_assets(folder):
+    assets = {}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                assets[filename] = build_page(f.read(), mimetypes.guess_type(name)[0] or 'application/octet-stream')
+    return assets
+
+def _prerender(app):
+    pages = {}
+    for endpoint, view in list(app.view_functions.items()):
+        if getattr(view, 'prerender', False):
+            with app.test_request_context():
+                path = url_for(endpoint)
+            with app.test_request_context(path):
+                pages[endpoint] = build_page(view.__wrapped__())
+    return pages
+
+def _serve_assets(app, assets):
+    send_static_file = app.view_functions['static']
+    max_age = app.config['STATIC_MAX_AGE']
+
+    @app.url_defaults
+    def version_static_urls(endpoint, values):
+        # A changed file gets a new URL, so browsers may keep the old one forever.
+        if endpoint == 'static' and 'v' not in values:
+            asset = assets.get(values.get('filename'))
+            if asset:
+                values['v'] = asset.etag
+
+    def static(filename):
+        asset = assets.get(filename)
+        if asset is None:
+            return send_static_file(filename=filename)
+        return respond(asset, max_age if request.args.get('v') == asset.etag else None)
+
+    app.view_functions['static'] = static
+
+def init_app(app):
+    """Pre-render the static pages and load ``static/`` into memory.
+
+    Call after the blueprints are registered. With PAGE_CACHE off (as in
+    development, where templates and assets change under a running server)
+    everything is rendered and served as usual.
+    """
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
+    app.extensions['pages'] = {}
+    if not app.config.get('PAGE_CACHE'):
+        return
+    if app.static_folder and os.path.isdir(app.static_folder):
+        _serve_assets(app, _load_assets(app.static_folder))
+    # After the static URL hook, so the pre-rendered pages link versioned assets.
+    app.extensions['pages'] = _prerender(app)
@@ -0,0 +1,48 @@
+import base64
+from datetime import datetime
+
+from app import db
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+def encode_cursor(sort_value, row_id):
+    raw = f"{sort_value.isoformat() if sort_value else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        sort_value, row_id = raw.rsplit('|', 1)
+        return (datetime.fromisoformat(sort_value) if sort_value else None), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def clamp_per_page(per_page):
+    return max(1, min(per_page or DEFAULT_PER_PAGE, MAX_PER_PAGE))
+
+def keyset_page(query, sort_column, id_column, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """Newest-first page of ``query`` that starts after ``cursor``.
+
+    Rows are ordered by ``(sort_column, id_column)`` descending and the next
+    page is selected with a range predicate on those columns, so every page
+    costs the same index walk no matter how deep it is. Returns the rows and
+    the cursor for the following page (``None`` on the last page).
+    """
+    per_page = clamp_per_page(per_page)
+    position = decode_cursor(cursor)
+    if position:
+        sort_value, row_id = position
+        query = query.filter(db.or_(
+            sort_column < sort_value,
+            db.and_(sort_column == sort_value, id_column < row_id),
+        ))
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
@@ -0,0 +1,52 @@
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Hashes allowed to wait for a pool process, per process; further callers
+# block until a slot frees up instead of growing the queue without bound.
+QUEUED_PER_WORKER = 4
+
+_pool = None
+_slots = None
+_lock = threading.Lock()
+
+def _executor():
+    global _pool, _slots
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return None
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _slots = threading.BoundedSemaphore(workers * QUEUED_PER_WORKER)
+                # Created on first use, after any pre-fork, and spawned so the
+                # children do not inherit the web worker's threads and sockets.
+                _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+def _run(fn, *args):
+    pool = _executor()
+    if pool is None:
+        return fn(*args)
+    with _slots:
+        return pool.submit(fn, *args).result()
+
+def hash_password(password):
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+@functools.lru_cache(maxsize=None)
+def _method_prefix(method):
+    # Werkzeug fills in defaults ("scrypt" is stored as "scrypt:32768:8:1"),
+    # so compare with what it actually writes for this setting.
+    return generate_password_hash('', method).split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    """True if ``password_hash`` was made with other than the configured cost."""
+    return password_hash.split('$', 1)[0] != _method_prefix(current_app.config['PASSWORD_HASH_METHOD'])
@@ -0,0 +1,267 @@
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+
+METRICS = ('requests', 'donations', 'inventory')
+# Range served by the trends API when no start date is given.
+DEFAULT_DAYS = {'day': 30, 'week': 182}
+# The trends API refuses ranges with more buckets than this.
+MAX_POINTS = 1000
+
+def week_of(day):
+    """The Monday starting the week that contains ``day``."""
+    return day - timedelta(days=day.weekday())
+
+def _add(deltas, metric, when, blood_type, status, count=1, quantity_ml=0):
+    day = when.date() if isinstance(when, datetime) else when
+    entry = deltas.setdefault((metric, day, blood_type or '', status or ''), [0, 0])
+    entry[0] += count
+    entry[1] += quantity_ml or 0
+
+def _upsert(connection, table, period, rows):
+    insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=['metric', period, 'blood_type', 'status'],
+        set_={'count': table.c.count + statement.excluded.count,
+              'quantity_ml': table.c.quantity_ml + statement.excluded.quantity_ml},
+    )
+    connection.execute(statement, rows)
+
+def apply_deltas(deltas, connection=None):
+    """Add ``deltas`` to the daily and weekly rollups in the current transaction.
+
+    ``deltas`` maps (metric, day, blood_type, status) to [count, quantity_ml].
+    """
+    from models import DailyRollup, WeeklyRollup
+    weekly = {}
+    for (metric, day, blood_type, status), (count, quantity_ml) in deltas.items():
+        entry = weekly.setdefault((metric, week_of(day), blood_type, status), [0, 0])
+        entry[0] += count
+        entry[1] += quantity_ml
+    connection = connection or db.session.connection()
+    for model, period, totals in ((DailyRollup, 'day', deltas), (WeeklyRollup, 'week', weekly)):
+        # Sorted so concurrent writers lock rows in the same order.
+        rows = [{'metric': metric, period: day, 'blood_type': blood_type, 'status': status,
+                 'count': count, 'quantity_ml': quantity_ml}
+                for (metric, day, blood_type, status), (count, quantity_ml) in sorted(totals.items())
+                if count or quantity_ml]
+        if rows:
+            _upsert(connection, model.__table__, period, rows)
+
+def donor_blood_types(connection, donor_ids):
+    """Map donor user ids to their profile's blood type."""
+    from models import DonorProfile
+    donor_ids = list(set(donor_ids))
+    types = {}
+    for i in range(0, len(donor_ids), 500):
+        types.update(connection.execute(db.select(DonorProfile.user_id, DonorProfile.blood_type).where(
+            DonorProfile.user_id.in_(donor_ids[i:i + 500]))).all())
+    return types
+
+def record_requests(rows):
+    """Count blood requests written with a bulk INSERT (column dicts)."""
+    deltas = {}
+    for row in rows:
+        _add(deltas, 'requests', row['created_at'], row['blood_type'], row['status'], 1, row['quantity_ml'])
+    apply_deltas(deltas)
+
+def record_requests_moved(rows, old_status, new_status):
+    """Move ``(created_at, blood_type, quantity_ml)`` requests changed by a bulk UPDATE to ``new_status``."""
+    deltas = {}
+    for created_at, blood_type, quantity_ml in rows:
+        _add(deltas, 'requests', created_at, blood_type, old_status, -1, -quantity_ml)
+        _add(deltas, 'requests', created_at, blood_type, new_status, 1, quantity_ml)
+    apply_deltas(deltas)
+
+def record_bookings_moved(bookings, old_status, new_status):
+    """Move ``(donor_id, scheduled_date)`` bookings changed by a bulk UPDATE to ``new_status``."""
+    connection = db.session.connection()
+    types = donor_blood_types(connection, [donor_id for donor_id, _ in bookings])
+    deltas = {}
+    for donor_id, scheduled_date in bookings:
+        _add(deltas, 'donations', scheduled_date, types.get(donor_id), old_status, -1)
+        _add(deltas, 'donations', scheduled_date, types.get(donor_id), new_status, 1)
+    apply_deltas(deltas, connection)
+
+def record_inventory(adjustments, when=None):
+    """Count ``(blood_type, delta_ml)`` ledger entries written outside the ORM."""
+    when = when or datetime.utcnow()
+    deltas = {}
+    for blood_type, delta_ml in adjustments:
+        _add(deltas, 'inventory', when, blood_type, 'in' if delta_ml >= 0 else 'out', 1, abs(delta_ml))
+    apply_deltas(deltas)
+
+def _previous(obj, names):
+    """Values of ``names`` before this flush, or None if none of them changed."""
+    state = db.inspect(obj)
+    values, changed = [], False
+    for name in names:
+        history = state.attrs[name].history
+        if history.deleted:
+            values.append(history.deleted[0])
+            changed = True
+        else:
+            values.append(getattr(obj, name))
+    return values if changed else None
+
+REQUEST_KEYS = ('created_at', 'blood_type', 'status', 'quantity_ml')
+BOOKING_KEYS = ('donor_id', 'scheduled_date', 'status')
+
+@event.listens_for(db.session, 'after_flush')
+def _roll_up_flush(session, flush_context):
+    # ORM writes are rolled up in the same transaction; bulk statements call
+    # the record_* functions above instead.
+    from models import BloodRequest, DonationSchedule
+    deltas, bookings = {}, []
+    changes = [(obj, 1, None) for obj in session.new]
+    changes += [(obj, -1, None) for obj in session.deleted]
+    changes += [(obj, 1, obj) for obj in session.dirty]
+    for obj, sign, dirty in changes:
+        if isinstance(obj, BloodRequest):
+            if dirty is not None:
+                previous = _previous(obj, REQUEST_KEYS)
+                if previous is None:
+                    continue
+                created_at, blood_type, status, quantity_ml = previous
+                _add(deltas, 'requests', created_at or datetime.utcnow(), blood_type, status,
+                     -1, -(quantity_ml or 0))
+            _add(deltas, 'requests', obj.created_at or datetime.utcnow(), obj.blood_type, obj.status,
+                 sign, sign * (obj.quantity_ml or 0))
+        elif isinstance(obj, DonationSchedule):
+            if dirty is not None:
+                previous = _previous(obj, BOOKING_KEYS)
+                if previous is None:
+                    continue
+                bookings.append((*previous, -1))
+            bookings.append((obj.donor_id, obj.scheduled_date, obj.status, sign))
+    if bookings:
+        types = donor_blood_types(session.connection(), [donor_id for donor_id, _, _, _ in bookings])
+        for donor_id, scheduled_date, status, sign in bookings:
+            _add(deltas, 'donations', scheduled_date, types.get(donor_id), status, sign)
+    if deltas:
+        apply_deltas(deltas, session.connection())
+
+def _day(column):
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.date(column)
+    return db.cast(column, db.Date)
+
+def _week(column):
+    if db.engine.dialect.name == 'sqlite':
+        # Forward to Sunday (or stay on it), then back to that week's Monday.
+        return db.func.date(column, 'weekday 0', '-6 days')
+    return db.cast(db.func.date_trunc('week', column), db.Date)
+
+def rebuild(since=None):
+    """Recompute the rollups from the source tables, from ``since`` or entirely.
+
+    Runs as one transaction and returns the number of daily rows written.
+    Rows before ``since`` are left alone, so a partial rebuild is cheap.
+    """
+    from models import BloodRequest, DailyRollup, DonationSchedule, DonorProfile, InventoryTransaction, WeeklyRollup
+    daily, weekly = DailyRollup.__table__, WeeklyRollup.__table__
+    start = datetime.combine(since, datetime.min.time()) if since else None
+
+    def grouped(metric, source, when, blood_type, status, quantity_ml, *joins):
+        day = _day(when)
+        query = db.select(db.literal(metric), day, db.func.coalesce(blood_type, ''), db.func.coalesce(status, ''),
+                          db.func.count(), db.func.coalesce(db.func.sum(quantity_ml), 0)).select_from(source)
+        for target, on in joins:
+            query = query.outerjoin(target, on)
+        if start is not None:
+            query = query.where(when >= start)
+        return query.group_by(day, db.func.coalesce(blood_type, ''), db.func.coalesce(status, ''))
+
+    direction = db.case((InventoryTransaction.delta_ml >= 0, 'in'), else_='out')
+    sources = [
+        grouped('requests', BloodRequest, BloodRequest.created_at, BloodRequest.blood_type, BloodRequest.status,
+                BloodRequest.quantity_ml),
+        grouped('donations', DonationSchedule, DonationSchedule.scheduled_date, DonorProfile.blood_type,
+                DonationSchedule.status, db.literal(0),
+                (DonorProfile, DonorProfile.user_id == DonationSchedule.donor_id)),
+        grouped('inventory', InventoryTransaction, InventoryTransaction.created_at, InventoryTransaction.blood_type,
+                direction, db.func.abs(InventoryTransaction.delta_ml)),
+    ]
+    columns = ['metric', 'day', 'blood_type', 'status', 'count', 'quantity_ml']
+    try:
+        db.session.execute(daily.delete().where(daily.c.day >= since) if since else daily.delete())
+        written = 0
+        for source in sources:
+            written += db.session.execute(daily.insert().from_select(columns, source)).rowcount
+        first_week = week_of(since) if since else None
+        week = _week(daily.c.day)
+        per_week = db.select(daily.c.metric, week, daily.c.blood_type, daily.c.status,
+                             db.func.sum(daily.c.count), db.func.sum(daily.c.quantity_ml))
+        if first_week:
+            per_week = per_week.where(daily.c.day >= first_week)
+        per_week = per_week.group_by(daily.c.metric, week, daily.c.blood_type, daily.c.status)
+        db.session.execute(weekly.delete().where(weekly.c.week >= first_week) if first_week else weekly.delete())
+        db.session.execute(weekly.insert().from_select(
+            ['metric', 'week', 'blood_type', 'status', 'count', 'quantity_ml'], per_week))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return written
+
+def buckets(start, end, granularity):
+    """Bucket start dates covering ``start`` to ``end`` inclusive."""
+    step = timedelta(days=1 if granularity == 'day' else 7)
+    day = start if granularity == 'day' else week_of(start)
+    result = []
+    while day <= end:
+        result.append(day)
+        day += step
+    return result
+
+def series(start, end, granularity='day', blood_type=None):
+    """Totals per day or week between ``start`` and ``end``, for charts.
+
+    Returns ``labels`` (ISO bucket start dates) and, per bucket, ``requests``
+    made, ``donations`` completed, ``requested_ml``, ``inventory_in_ml`` and
+    ``inventory_out_ml``. Only the rollup tables are read.
+    """
+    from models import DailyRollup, WeeklyRollup
+    model, period = (DailyRollup, DailyRollup.day) if granularity == 'day' else (WeeklyRollup, WeeklyRollup.week)
+    days = buckets(start, end, granularity)
+
+    def total(column, metric, status=None):
+        condition = model.metric == metric
+        if status is not None:
+            condition = db.and_(condition, model.status == status)
+        return db.func.coalesce(db.func.sum(db.case((condition, column), else_=0)), 0)
+
+    # One row per bucket, however many types and statuses it covers.
+    columns = {
+        'requests': total(model.count, 'requests'),
+        'donations': total(model.count, 'donations', 'completed'),
+        'requested_ml': total(model.quantity_ml, 'requests'),
+        'inventory_in_ml': total(model.quantity_ml, 'inventory', 'in'),
+        'inventory_out_ml': total(model.quantity_ml, 'inventory', 'out'),
+    }
+    query = db.session.query(period, *columns.values()).filter(
+        model.metric.in_(METRICS), period >= days[0], period <= end)
+    if blood_type:
+        query = query.filter(model.blood_type == blood_type)
+    index = {day: i for i, day in enumerate(days)}
+    result = {name: [0] * len(days) for name in columns}
+    for day, *values in query.group_by(period):
+        for name, value in zip(columns, values):
+            result[name][index[day]] = value
+    result['labels'] = [day.isoformat() for day in days]
+    return result
+
+rollups_cli = AppGroup('rollups', help='Pre-aggregated activity for the trends chart.')
+
+@rollups_cli.command('rebuild')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='Only rebuild from this date on.')
+def rebuild_command(since):
+    """Recompute the daily and weekly rollups from the source tables."""
+    written = rebuild(since.date() if since else None)
+    click.echo(f'{written} daily rollup rows written.')
@@ -1,50 +1,115 @@
-from flask import render_template, flash, redirect, url_for, request
+from flask import Blueprint, abort, current_app, render_template, flash, redirect, url_for, request, jsonify, session, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
-from app import app, db
-from models import User, DonorProfile, BloodInventory, BloodRequest, Notification, DonationSchedule #Added DonationSchedule
-from forms import LoginForm, RegistrationForm, DonorProfileForm, BloodRequestForm, InventoryUpdateForm, DonationScheduleForm, DonorSearchForm #Added DonationScheduleForm, DonorSearchForm
-from datetime import datetime
+from app import db
+from database import use_replica
+from models import User, DonorProfile, BloodRequest, Notification, DonationSite, InventoryTransaction
+from forms import LoginForm, RegistrationForm, DonorProfileForm, BloodRequestForm, InventoryUpdateForm, DonationScheduleForm, DonorSearchForm, MarkNotificationsReadForm #Added DonationScheduleForm, DonorSearchForm
+from datetime import datetime, timedelta
+from geo import geocode_zip, haversine_miles, nearby_donors
+from locations import autocomplete, location_filter
+from matching import BLOOD_TYPES, match_request, match_pending_requests
+from inventory import InsufficientInventory, adjust_inventory, apply_adjustments, current_inventory, invalidate_inventory_cache
 from sqlalchemy import inspect
-
-def init_blood_inventory():
-    blood_types = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
-    for blood_type in blood_types:
-        if not BloodInventory.query.filter_by(blood_type=blood_type).first():
-            inventory = BloodInventory(blood_type=blood_type, quantity_ml=0)
-            db.session.add(inventory)
-    db.session.commit()
-
-@app.route('/')
+from sqlalchemy.orm import joinedload
+from pagination import keyset_page
+from notifications import notification_summary, notify, mark_read
+from cache import TTLCache
+from pages import build_page, prerendered, respond
+from jobs import enqueue, job_queue
+from rollups import DEFAULT_DAYS, MAX_POINTS, series
+from scheduling import DonorNotEligible, SlotUnavailable, book_donation, check_in, eligible_donors, next_available_day
+from units import allocate_units, expiring_soon
+from triage import MAX_TRIAGE_BATCH, TRIAGE_ACTIONS, TRIAGE_QUEUE_LIMIT, ReservationShortfall, decide_requests, decision_message, triage, triage_queue
+from transfer import EXPORTABLE, IMPORTERS, export_csv, export_ndjson, import_rows, read_csv, read_ndjson
+
+bp = Blueprint('main', __name__)
+
+SEARCH_RESULT_LIMIT = 200
+DASHBOARD_NOTIFICATIONS = 10
+IMPORT_READERS = {'text/csv': read_csv, 'application/x-ndjson': read_ndjson, 'application/jsonl': read_ndjson}
+
+_home_pages = TTLCache(maxsize=8, ttl=300)
+# Totals over every user and every request ever made; a minute old is fine.
+_admin_totals = TTLCache(maxsize=1, ttl=60)
+
+def _conditional(response, state):
+    response.set_etag(state.etag)
+    if state.last_modified:
+        response.last_modified = state.last_modified
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@bp.route('/')
 def home():
-    # Initialize blood inventory if empty
-    if not BloodInventory.query.first():
-        init_blood_inventory()
-    inventory = BloodInventory.query.all()
-    return render_template('home.html', inventory=inventory)
-
-@app.route('/login', methods=['GET', 'POST'])
+    state = current_inventory()
+    if current_user.is_authenticated or session.get('_flashes'):
+        return render_template('home.html', inventory=state.items, inventory_version=state.etag)
+
+    # Anonymous visitors all see the same page, which only changes with the
+    # inventory: render it once per inventory version and let clients revalidate.
+    # The ETag hashes the HTML itself, so a deploy that changes the templates
+    # is not answered with a 304 for the old page.
+    page = _home_pages.get_or_set(state.etag, lambda: build_page(
+        render_template('home.html', inventory=state.items, inventory_version=state.etag)))
+    response = respond(page)
+    response.vary.add('Cookie')
+    return response
+
+@bp.route('/api/inventory')
+def inventory_api():
+    state = current_inventory()
+    response = jsonify(
+        inventory=[{'blood_type': item.blood_type, 'quantity_ml': item.quantity_ml} for item in state.items],
+        last_modified=state.last_modified.isoformat() if state.last_modified else None,
+    )
+    return _conditional(response, state)
+
+@bp.route('/api/trends')
+@login_required
+@use_replica
+def trends_api():
+    granularity = request.args.get('granularity', 'week')
+    if granularity not in DEFAULT_DAYS:
+        return jsonify(error='granularity must be day or week.'), 400
+    blood_type = request.args.get('blood_type') or None
+    if blood_type and blood_type not in BLOOD_TYPES:
+        return jsonify(error='Unknown blood_type.'), 400
+    try:
+        end = (datetime.strptime(request.args['end'], '%Y-%m-%d').date() if 'end' in request.args
+               else datetime.utcnow().date())
+        start = (datetime.strptime(request.args['start'], '%Y-%m-%d').date() if 'start' in request.args
+                 else end - timedelta(days=DEFAULT_DAYS[granularity] - 1))
+    except ValueError:
+        return jsonify(error='start and end must be YYYY-MM-DD.'), 400
+    if start > end or (end - start).days // (7 if granularity == 'week' else 1) >= MAX_POINTS:
+        return jsonify(error=f'start must not be after end, and the range at most {MAX_POINTS} {granularity}s.'), 400
+    return jsonify(granularity=granularity, **series(start, end, granularity, blood_type))
+
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         if user and user.check_password(form.password.data):
+            db.session.commit()  # saves a rehashed password, if any
             login_user(user)
             next_page = request.args.get('next')
             if user.role == 'donor':
-                return redirect(next_page or url_for('donor_dashboard'))
+                return redirect(next_page or url_for('main.donor_dashboard'))
             elif user.role == 'recipient':
-                return redirect(next_page or url_for('recipient_dashboard'))
+                return redirect(next_page or url_for('main.recipient_dashboard'))
             else:
-                return redirect(next_page or url_for('admin_dashboard'))
+                return redirect(next_page or url_for('main.admin_dashboard'))
         flash('Invalid email or password', 'danger')
     return render_template('auth/login.html', form=form)
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     form = RegistrationForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data, role=form.role.data)
@@ -52,34 +117,35 @@ def register():
         db.session.add(user)
         db.session.commit()
         flash('Registration successful!', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('auth/register.html', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
-@app.route('/donor/dashboard')
+@bp.route('/donor/dashboard')
 @login_required
+@use_replica
 def donor_dashboard():
     if current_user.role != 'donor':
         flash('Access denied.', 'danger')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     profile = current_user.donor_profile
-    notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).all()
+    notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).limit(DASHBOARD_NOTIFICATIONS).all()
     health_records = []  # To be implemented
     return render_template('donor/dashboard.html', profile=profile, notifications=notifications, health_records=health_records)
 
-@app.route('/donor/create_profile', methods=['GET', 'POST'])
+@bp.route('/donor/create_profile', methods=['GET', 'POST'])
 @login_required
 def create_donor_profile():
     if current_user.role != 'donor':
         flash('Access denied.', 'danger')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     if current_user.donor_profile:
-        return redirect(url_for('donor_dashboard'))
+        return redirect(url_for('main.donor_dashboard'))
 
     form = DonorProfileForm()
     if form.validate_on_submit():
@@ -92,39 +158,40 @@ def create_donor_profile():
             city=form.city.data,
             state=form.state.data,
             zip_code=form.zip_code.data,
-            # Initialize these as None for now, can be updated later with geocoding
-            latitude=None,
-            longitude=None,
             availability_status='available'
         )
+        coordinates = geocode_zip(form.zip_code.data)
+        if coordinates:
+            profile.set_coordinates(*coordinates)
         db.session.add(profile)
         try:
             db.session.commit()
             flash('Donor profile created successfully!', 'success')
-            return redirect(url_for('donor_dashboard'))
+            return redirect(url_for('main.donor_dashboard'))
         except Exception as e:
             db.session.rollback()
             flash('Error creating profile. Please try again.', 'danger')
-            app.logger.error(f"Error creating donor profile: {str(e)}")
+            current_app.logger.error(f"Error creating donor profile: {str(e)}")
 
     return render_template('donor/create_profile.html', form=form)
 
-@app.route('/recipient/dashboard')
+@bp.route('/recipient/dashboard')
 @login_required
+@use_replica
 def recipient_dashboard():
     if current_user.role != 'recipient':
         flash('Access denied.', 'danger')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     requests = BloodRequest.query.filter_by(recipient_id=current_user.id).order_by(BloodRequest.created_at.desc()).all()
-    notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).all()
+    notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).limit(DASHBOARD_NOTIFICATIONS).all()
     return render_template('recipient/dashboard.html', requests=requests, notifications=notifications)
 
-@app.route('/recipient/request_blood', methods=['GET', 'POST'])
+@bp.route('/recipient/request_blood', methods=['GET', 'POST'])
 @login_required
 def request_blood():
     if current_user.role != 'recipient':
         flash('Access denied.', 'danger')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
     form = BloodRequestForm()
     if form.validate_on_submit():
@@ -138,144 +205,404 @@ def request_blood():
             notes=form.notes.data
         )
         db.session.add(request)
+        if request.emergency:
+            db.session.flush()
+            enqueue('emergency_fanout', {'request_id': request.id})
         db.session.commit()
         flash('Blood request submitted successfully!', 'success')
-        return redirect(url_for('recipient_dashboard'))
+        return redirect(url_for('main.recipient_dashboard'))
     return render_template('recipient/request_blood.html', form=form)
 
-@app.route('/admin/dashboard')
+def _admin_request_query():
+    query = BloodRequest.query.options(joinedload(BloodRequest.recipient))
+    if request.args.get('status'):
+        query = query.filter(BloodRequest.status == request.args.get('status'))
+    if request.args.get('emergency') in ('1', 'true', 'yes'):
+        query = query.filter(BloodRequest.emergency.is_(True))
+    elif request.args.get('emergency') in ('0', 'false', 'no'):
+        query = query.filter(BloodRequest.emergency.is_(False))
+    if request.args.get('blood_type'):
+        query = query.filter(BloodRequest.blood_type == request.args.get('blood_type'))
+    return keyset_page(query, BloodRequest.created_at, BloodRequest.id,
+                       request.args.get('cursor'), request.args.get('per_page', type=int))
+
+def _request_json(blood_request):
+    return {
+        'id': blood_request.id,
+        'created_at': blood_request.created_at.isoformat(),
+        'recipient': blood_request.recipient.username,
+        'blood_type': blood_request.blood_type,
+        'quantity_ml': blood_request.quantity_ml,
+        'hospital_name': blood_request.hospital_name,
+        'emergency': blood_request.emergency,
+        'status': blood_request.status,
+    }
+
+def _admin_user_query():
+    query = User.query
+    if request.args.get('role'):
+        query = query.filter(User.role == request.args.get('role'))
+    return keyset_page(query, User.created_at, User.id,
+                       request.args.get('users_cursor'), request.args.get('per_page', type=int))
+
+def _load_admin_totals():
+    role_counts = dict(db.session.query(User.role, db.func.count()).group_by(User.role).all())
+    return {
+        'donors': role_counts.get('donor', 0),
+        'recipients': role_counts.get('recipient', 0),
+        'emergency': BloodRequest.query.filter(BloodRequest.emergency.is_(True)).count(),
+    }
+
+@bp.route('/admin/dashboard')
 @login_required
+@use_replica
 def admin_dashboard():
     if current_user.role != 'admin':
         flash('Access denied.', 'danger')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
-    inventory = BloodInventory.query.all()
-    requests = BloodRequest.query.order_by(BloodRequest.created_at.desc()).all()
-    users = User.query.all()
-    return render_template('admin/dashboard.html', inventory=inventory, requests=requests, users=users)
+    inventory = current_inventory().items
+    requests, next_cursor = _admin_request_query()
+    users, next_users_cursor = _admin_user_query()
+    # The pending count only walks the backlog, through its index, so it stays live.
+    stats = dict(_admin_totals.get_or_set('totals', _load_admin_totals),
+                 pending=BloodRequest.query.filter(BloodRequest.status == 'pending').count())
+    filters = {key: request.args.get(key) for key in ('status', 'emergency', 'blood_type', 'role', 'per_page')
+               if request.args.get(key)}
+    return render_template('admin/dashboard.html', inventory=inventory, expiring=expiring_soon(), requests=requests,
+                           users=users, stats=stats, filters=filters, next_cursor=next_cursor,
+                           next_users_cursor=next_users_cursor)
+
+@bp.route('/admin/api/requests')
+@login_required
+def admin_requests_api():
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+
+    requests, next_cursor = _admin_request_query()
+    return jsonify(items=[_request_json(blood_request) for blood_request in requests], next_cursor=next_cursor)
 
-@app.route('/admin/update_inventory', methods=['GET', 'POST'])
+@bp.route('/admin/api/triage_queue')
+@login_required
+@use_replica
+def triage_queue_api():
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+
+    limit = min(max(request.args.get('limit', TRIAGE_QUEUE_LIMIT, type=int), 1), MAX_TRIAGE_BATCH)
+    return jsonify(items=[dict(_request_json(entry.request), compatible_stock_ml=entry.compatible_stock_ml)
+                          for entry in triage_queue(limit)])
+
+@bp.route('/admin/requests/triage', methods=['POST'])
+@login_required
+def triage_requests():
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+
+    payload = request.get_json(silent=True) or {}
+    decisions = {}
+    for entry in payload.get('decisions', []):
+        request_id, action = entry.get('id'), entry.get('action')
+        if not isinstance(request_id, int) or action not in TRIAGE_ACTIONS or request_id in decisions:
+            return jsonify(error=f'Invalid decision: {entry}'), 400
+        decisions[request_id] = action
+    if not decisions:
+        return jsonify(error='No decisions given.'), 400
+    if len(decisions) > MAX_TRIAGE_BATCH:
+        return jsonify(error=f'At most {MAX_TRIAGE_BATCH} decisions per batch.'), 400
+
+    try:
+        result = triage(decisions, current_user.id, reserve=bool(payload.get('reserve')))
+    except ReservationShortfall as e:
+        return jsonify(error=str(e), request_id=e.request_id, shortfall_ml=e.shortfall_ml), 409
+    except InsufficientInventory as e:
+        return jsonify(error=str(e), blood_type=e.blood_type), 409
+    return jsonify(approved=result.approved, rejected=result.rejected, skipped=result.skipped, allocations=[{
+        'id': request_id,
+        'units': len(allocation.units),
+        'allocated_ml': allocation.allocated_ml,
+        'shortfall_ml': allocation.shortfall_ml,
+    } for request_id, allocation in result.allocations])
+
+@bp.route('/admin/api/users')
+@login_required
+def admin_users_api():
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+
+    users, next_cursor = _admin_user_query()
+    return jsonify(items=[{
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role,
+        'created_at': user.created_at.isoformat(),
+    } for user in users], next_cursor=next_cursor)
+
+@bp.route('/admin/update_inventory', methods=['GET', 'POST'])
 @login_required
 def update_inventory():
     if current_user.role != 'admin':
         flash('Access denied.', 'danger')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
     form = InventoryUpdateForm()
-    inventory = BloodInventory.query.all()
+    inventory = current_inventory().items
     
     if form.validate_on_submit():
         blood_type = form.blood_type.data
         quantity = form.quantity_ml.data
         operation = form.operation.data
         
-        inventory_item = BloodInventory.query.filter_by(blood_type=blood_type).first()
-        if not inventory_item:
-            inventory_item = BloodInventory(blood_type=blood_type, quantity_ml=0)
-            db.session.add(inventory_item)
-        
-        if operation == 'add':
-            inventory_item.quantity_ml += quantity
-        else:
-            if inventory_item.quantity_ml >= quantity:
-                inventory_item.quantity_ml -= quantity
-            else:
-                flash('Insufficient inventory for the requested quantity.', 'danger')
-                return redirect(url_for('update_inventory'))
-        
-        inventory_item.last_updated = datetime.utcnow()
-        db.session.commit()
+        delta = quantity if operation == 'add' else -quantity
+        try:
+            adjust_inventory(blood_type, delta, operation, current_user.id)
+        except InsufficientInventory:
+            flash('Insufficient inventory for the requested quantity.', 'danger')
+            return redirect(url_for('main.update_inventory'))
         flash('Inventory updated successfully!', 'success')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     
     return render_template('admin/update_inventory.html', form=form, inventory=inventory)
 
-@app.route('/admin/handle_request/<int:request_id>/<action>')
+@bp.route('/admin/inventory/bulk', methods=['POST'])
+@login_required
+def bulk_update_inventory():
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+
+    payload = request.get_json(silent=True) or {}
+    adjustments = []
+    for entry in payload.get('adjustments', []):
+        blood_type = entry.get('blood_type')
+        quantity = entry.get('quantity_ml')
+        operation = entry.get('operation', 'add')
+        if blood_type not in BLOOD_TYPES or not isinstance(quantity, int) or quantity <= 0 \
+                or operation not in ('add', 'remove'):
+            return jsonify(error=f'Invalid adjustment: {entry}'), 400
+        adjustments.append((blood_type, quantity if operation == 'add' else -quantity))
+    if not adjustments:
+        return jsonify(error='No adjustments given.'), 400
+    reason, max_length = payload.get('reason', 'bulk'), InventoryTransaction.reason.type.length
+    if not isinstance(reason, str) or not reason or len(reason) > max_length:
+        return jsonify(error=f'reason must be a string of at most {max_length} characters.'), 400
+
+    try:
+        balances = apply_adjustments(adjustments, reason, current_user.id)
+    except InsufficientInventory as e:
+        return jsonify(error=str(e), blood_type=e.blood_type), 409
+    return jsonify(applied=len(adjustments), balances=balances)
+
+@bp.route('/admin/import/<entity>', methods=['POST'])
+@login_required
+def bulk_import(entity):
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+    if entity not in IMPORTERS:
+        return jsonify(error=f'Cannot import {entity}.'), 404
+
+    # Neither type is one a cross-site form or fetch may send without a CORS
+    # preflight, which stands in for a CSRF token on this endpoint.
+    if request.mimetype not in IMPORT_READERS:
+        return jsonify(error='Send text/csv or application/x-ndjson.'), 415
+    # The body is parsed as it arrives, so uploads of any size use constant memory.
+    rows = IMPORT_READERS[request.mimetype](request.stream)
+    return jsonify(import_rows(entity, rows).as_dict())
+
+@bp.route('/admin/export/<entity>')
+@login_required
+def bulk_export(entity):
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+    if entity not in EXPORTABLE:
+        return jsonify(error=f'Cannot export {entity}.'), 404
+
+    if request.args.get('format') == 'ndjson':
+        body, mimetype, extension = export_ndjson(entity), 'application/x-ndjson', 'ndjson'
+    else:
+        body, mimetype, extension = export_csv(entity), 'text/csv', 'csv'
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={entity}.{extension}'
+    return response
+
+@bp.route('/admin/handle_request/<int:request_id>/<action>')
 @login_required
 def handle_request(request_id, action):
     if current_user.role != 'admin':
         flash('Access denied.', 'danger')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
     blood_request = BloodRequest.query.get_or_404(request_id)
+    if action not in TRIAGE_ACTIONS:
+        abort(404)
+    status = TRIAGE_ACTIONS[action]
+    # Only a pending request can be decided, so repeated or racing clicks
+    # neither claim units twice nor reject a request that holds units.
+    if not decide_requests([request_id], status):
+        db.session.rollback()
+        flash(f'Request has already been {db.session.get(BloodRequest, request_id).status}.', 'warning')
+        return redirect(url_for('main.admin_dashboard'))
+
+    allocation = None
     if action == 'approve':
-        blood_request.status = 'approved'
-        notification = Notification(
-            user_id=blood_request.recipient_id,
-            message=f'Your blood request for {blood_request.quantity_ml}ml of {blood_request.blood_type} has been approved.'
-        )
-        db.session.add(notification)
-    elif action == 'reject':
-        blood_request.status = 'rejected'
-        notification = Notification(
-            user_id=blood_request.recipient_id,
-            message=f'Your blood request for {blood_request.quantity_ml}ml of {blood_request.blood_type} has been rejected.'
-        )
-        db.session.add(notification)
-    
+        try:
+            allocation = allocate_units(blood_request, current_user.id)
+        except InsufficientInventory as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('main.admin_dashboard'))
+        if allocation.units:
+            flash(f'Allocated {len(allocation.units)} units ({allocation.allocated_ml}ml), earliest expiry first.', 'info')
+            if allocation.shortfall_ml:
+                flash(f'{allocation.shortfall_ml}ml is still needed.', 'warning')
+        else:
+            match = match_request(blood_request)
+            if match.shortfall_ml:
+                flash(f'Compatible stock is short by {match.shortfall_ml}ml; {len(match.donors)} eligible donors found.', 'warning')
+            else:
+                sources = ', '.join(f'{quantity}ml {blood_type}' for blood_type, quantity in match.allocation)
+                flash(f'Request can be filled from inventory: {sources}.', 'info')
+    notify(blood_request.recipient_id, decision_message(blood_request, status))
+
     db.session.commit()
+    if allocation and allocation.units:
+        invalidate_inventory_cache()
     flash('Request has been processed.', 'success')
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/donor/schedule_donation', methods=['GET', 'POST'])
+@bp.route('/admin/matches')
+@login_required
+def pending_matches():
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+
+    matches = match_pending_requests(limit=request.args.get('limit', 500, type=int))
+    return jsonify([{
+        'request_id': match.request.id,
+        'blood_type': match.request.blood_type,
+        'quantity_ml': match.request.quantity_ml,
+        'emergency': match.request.emergency,
+        'allocation': [{'blood_type': blood_type, 'quantity_ml': quantity} for blood_type, quantity in match.allocation],
+        'shortfall_ml': match.shortfall_ml,
+        'donors': [{'id': donor.id, 'blood_type': donor.blood_type, 'city': donor.city, 'state': donor.state}
+                   for donor in match.donors],
+    } for match in matches])
+
+@bp.route('/admin/jobs/metrics')
+@login_required
+def job_metrics():
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+    return jsonify(job_queue.stats())
+
+@bp.route('/donor/schedule_donation', methods=['GET', 'POST'])
 @login_required
 def schedule_donation():
     if current_user.role != 'donor':
         flash('Access denied.', 'danger')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
 
     if not current_user.donor_profile:
         flash('Please create your donor profile first.', 'warning')
-        return redirect(url_for('create_donor_profile'))
+        return redirect(url_for('main.create_donor_profile'))
 
     form = DonationScheduleForm()
+    sites = DonationSite.query.order_by(DonationSite.name).all()
+    form.site_id.choices = [(site.id, site.name) for site in sites]
     if form.validate_on_submit():
-        scheduled_date = form.donation_date.data
-
-        # Convert last_donation datetime to date for comparison
-        last_donation = current_user.donor_profile.last_donation
-        if last_donation:
-            last_donation_date = last_donation.date() if isinstance(last_donation, datetime) else last_donation
-            days_difference = (scheduled_date - last_donation_date).days
-            if days_difference < 56:
-                flash('You must wait at least 56 days between donations.', 'danger')
-                return redirect(url_for('schedule_donation'))
-
-        donation = DonationSchedule(
-            donor_id=current_user.id,
-            scheduled_date=datetime.combine(scheduled_date, datetime.min.time()),
-            status='scheduled'
-        )
-        db.session.add(donation)
-
-        # Update donor profile with datetime object
-        current_user.donor_profile.last_donation = datetime.combine(scheduled_date, datetime.min.time())
-        current_user.donor_profile.total_donations += 1
-
-        db.session.commit()
+        site = next(site for site in sites if site.id == form.site_id.data)
+        try:
+            book_donation(current_user.id, site, form.donation_date.data)
+        except DonorNotEligible as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.schedule_donation'))
+        except SlotUnavailable as e:
+            alternative = next_available_day(site, form.donation_date.data)
+            flash(f'{e} The next open day is {alternative:%B %d, %Y}.' if alternative else str(e), 'danger')
+            return redirect(url_for('main.schedule_donation'))
         flash('Donation scheduled successfully!', 'success')
-        return redirect(url_for('donor_dashboard'))
+        return redirect(url_for('main.donor_dashboard'))
 
     return render_template('donor/schedule_donation.html', form=form, today=datetime.now().date())
 
-@app.route('/learn/donation')
+@bp.route('/admin/donors/eligible')
+@login_required
+def eligible_donors_api():
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+    blood_type = request.args.get('blood_type')
+    if blood_type not in BLOOD_TYPES:
+        return jsonify(error='blood_type is required.'), 400
+    try:
+        on_date = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify(error='date must be YYYY-MM-DD.'), 400
+
+    query = eligible_donors(blood_type, on_date)
+    if request.args.get('available') in ('1', 'true', 'yes'):
+        query = query.filter(DonorProfile.availability_status == 'available')
+    donors = query.order_by(DonorProfile.last_donation, DonorProfile.id).limit(
+        min(request.args.get('limit', 100, type=int), 1000)).all()
+    return jsonify(count=query.count(), donors=[{
+        'id': donor.id, 'user_id': donor.user_id, 'last_donation': donor.last_donation.isoformat() if donor.last_donation else None,
+        'city': donor.city, 'state': donor.state,
+    } for donor in donors])
+
+@bp.route('/admin/schedules/check_in', methods=['POST'])
+@login_required
+def check_in_donors():
+    if current_user.role != 'admin':
+        return jsonify(error='Access denied.'), 403
+    schedule_ids = (request.get_json(silent=True) or {}).get('schedule_ids', [])
+    if not schedule_ids or not all(isinstance(schedule_id, int) for schedule_id in schedule_ids):
+        return jsonify(error='schedule_ids must be a list of ids.'), 400
+    return jsonify(checked_in=check_in(schedule_ids))
+
+@bp.route('/learn/donation')
+@prerendered
 def learn_about_donation():
     return render_template('learn/about_donation.html')
 
-@app.route('/learn/process')
+@bp.route('/learn/process')
+@prerendered
 def donation_process():
     return render_template('learn/donation_process.html')
 
-@app.context_processor
+@bp.app_context_processor
 def utility_processor():
-    def get_notifications():
+    # Called from the template only when the navbar actually needs it.
+    def get_notification_summary():
         if current_user.is_authenticated:
-            return Notification.query.filter_by(user_id=current_user.id, read=False).all()
-        return []
-    return dict(notifications=get_notifications())
+            return notification_summary(current_user.id)
+        return None
+    return dict(notification_summary=get_notification_summary)
 
-@app.route('/donor/search', methods=['GET'])
+@bp.route('/notifications')
+@login_required
+def notification_inbox():
+    query = Notification.query.filter(Notification.user_id == current_user.id)
+    if request.args.get('unread'):
+        query = query.filter(Notification.read.is_(False))
+    notifications, next_cursor = keyset_page(query, Notification.created_at, Notification.id,
+                                             request.args.get('cursor'), request.args.get('per_page', type=int))
+    return render_template('notifications/inbox.html', notifications=notifications, next_cursor=next_cursor,
+                           unread_only=bool(request.args.get('unread')), form=MarkNotificationsReadForm())
+
+@bp.route('/notifications/mark_read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    form = MarkNotificationsReadForm()
+    if form.validate_on_submit():
+        if form.mark_all.data:
+            updated = mark_read(current_user.id)
+        else:
+            ids = request.form.getlist('notification_ids', type=int)
+            updated = mark_read(current_user.id, ids) if ids else 0
+        flash(f'{updated} notification(s) marked as read.', 'success')
+    return redirect(request.referrer or url_for('main.notification_inbox'))
+
+@bp.route('/donor/search', methods=['GET'])
+@use_replica
 def search_donors():
     form = DonorSearchForm()
     donors = []
@@ -288,18 +615,38 @@ def search_donors():
             query = query.filter(DonorProfile.blood_type == request.args.get('blood_type'))
 
         if request.args.get('city'):
-            query = query.filter(DonorProfile.city.ilike(f"%{request.args.get('city')}%"))
+            query = query.filter(location_filter('city', request.args.get('city')))
 
         if request.args.get('state'):
-            query = query.filter(DonorProfile.state.ilike(f"%{request.args.get('state')}%"))
+            query = query.filter(location_filter('state', request.args.get('state')))
 
-        if request.args.get('zip_code'):
-            query = query.filter(DonorProfile.zip_code == request.args.get('zip_code'))
+        zip_code = request.args.get('zip_code')
+        radius = request.args.get('radius', type=int)
+        origin = geocode_zip(zip_code) if zip_code else None
 
-        donors = query.all()
+        if origin and radius:
+            donors = nearby_donors(query, origin[0], origin[1], min(radius, 100), limit=SEARCH_RESULT_LIMIT)
+        else:
+            if zip_code:
+                if radius:
+                    flash('Unknown ZIP code, showing exact ZIP matches only.', 'warning')
+                query = query.filter(DonorProfile.zip_code == zip_code)
+            donors = query.limit(SEARCH_RESULT_LIMIT).all()
+            if origin:
+                for donor in donors:
+                    if donor.latitude is not None and donor.longitude is not None:
+                        donor.distance = haversine_miles(origin[0], origin[1], donor.latitude, donor.longitude)
 
     return render_template('donor/search.html', form=form, donors=donors)
 
-@app.route('/learn/eligibility')
+@bp.route('/api/locations/autocomplete')
+def location_autocomplete():
+    field = request.args.get('field', 'city')
+    if field not in ('city', 'state'):
+        return jsonify(error='field must be city or state'), 400
+    return jsonify(autocomplete(field, request.args.get('q', ''), state=request.args.get('state')))
+
+@bp.route('/learn/eligibility')
+@prerendered
 def eligibility_requirements():
     return render_template('learn/eligibility.html')
\ No newline at end of file
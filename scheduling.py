@@ -0,0 +1,182 @@
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from inventory import invalidate_inventory_cache
+from jobs import recurring
+from matching import DONATION_INTERVAL
+from rollups import record_bookings_moved
+from units import collect_donations
+
+# How far ahead next_available_day looks for a free slot.
+BOOKING_HORIZON_DAYS = 90
+# Bookings are settled once their day has passed; hourly keeps that prompt.
+CLOSE_INTERVAL = timedelta(hours=1)
+
+class SlotUnavailable(Exception):
+    def __init__(self, site, day, reason='fully booked'):
+        super().__init__(f'{site.name} is {reason} on {day:%B %d, %Y}.')
+        self.site = site
+        self.day = day
+
+class DonorNotEligible(Exception):
+    pass
+
+def _reserve(site, day):
+    from models import DonationSlot
+    # Capacity check and increment are one statement, so concurrent bookings
+    # cannot overbook a slot.
+    statement = db.update(DonationSlot).where(
+        DonationSlot.site_id == site.id,
+        DonationSlot.day == day,
+        DonationSlot.booked < DonationSlot.capacity,
+    ).values(booked=DonationSlot.booked + 1).returning(DonationSlot.id)
+    if db.session.execute(statement).scalar() is not None:
+        return
+    if site.daily_capacity < 1 or DonationSlot.query.filter_by(site_id=site.id, day=day).first():
+        raise SlotUnavailable(site, day)
+    # First booking of the day; a concurrent first booking fails the unique
+    # constraint at commit and is retried against this row.
+    db.session.add(DonationSlot(site_id=site.id, day=day, capacity=site.daily_capacity, booked=1))
+
+def _check_eligible(donor_id, day):
+    from models import DonationSchedule, DonorProfile
+    if day < date.today():
+        raise DonorNotEligible('Please choose a date in the future.')
+    profile = DonorProfile.query.filter_by(user_id=donor_id).first()
+    if profile is None:
+        raise DonorNotEligible('Please create your donor profile first.')
+    if profile.last_donation and (day - profile.last_donation.date()) < DONATION_INTERVAL:
+        raise DonorNotEligible('You must wait at least 56 days between donations.')
+    window = datetime.combine(day, datetime.min.time())
+    clash = DonationSchedule.query.filter(
+        DonationSchedule.donor_id == donor_id,
+        DonationSchedule.status.in_(('scheduled', 'checked_in')),
+        DonationSchedule.scheduled_date > window - DONATION_INTERVAL,
+        DonationSchedule.scheduled_date < window + DONATION_INTERVAL,
+    ).first()
+    if clash:
+        raise DonorNotEligible(
+            f'You already have a donation booked on {clash.scheduled_date:%B %d, %Y}; '
+            'bookings must be at least 56 days apart.')
+
+def book_donation(donor_id, site, day):
+    """Reserve a place at ``site`` on ``day`` and record the booking.
+
+    Raises DonorNotEligible or SlotUnavailable, after rolling back. The
+    donor's last_donation and total_donations only change once the donation
+    is completed, see close_past_schedules.
+    """
+    from models import DonationSchedule
+    _check_eligible(donor_id, day)
+    for attempt in range(2):
+        try:
+            _reserve(site, day)
+            schedule = DonationSchedule(donor_id=donor_id, site_id=site.id, status='scheduled',
+                                        scheduled_date=datetime.combine(day, datetime.min.time()))
+            db.session.add(schedule)
+            db.session.commit()
+            return schedule
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
+        except SlotUnavailable:
+            db.session.rollback()
+            raise
+
+def next_available_day(site, after):
+    """First day after ``after`` with room at ``site``, or None within the horizon."""
+    from models import DonationSlot
+    full = {day for (day,) in db.session.query(DonationSlot.day).filter(
+        DonationSlot.site_id == site.id,
+        DonationSlot.day > after,
+        DonationSlot.day <= after + timedelta(days=BOOKING_HORIZON_DAYS),
+        DonationSlot.booked >= DonationSlot.capacity,
+    )}
+    for offset in range(1, BOOKING_HORIZON_DAYS + 1):
+        day = after + timedelta(days=offset)
+        if day not in full:
+            return day
+    return None
+
+def eligible_donors(blood_type, on_date):
+    """Donors of ``blood_type`` who may donate on ``on_date``, for recruitment drives.
+
+    Served by ix_donor_profile_type_last_donation; availability is left to
+    the caller to filter on.
+    """
+    from models import DonorProfile
+    cutoff = datetime.combine(on_date, datetime.min.time()) - DONATION_INTERVAL
+    # Spelled out per branch so each one is a range on the index.
+    return DonorProfile.query.filter(db.or_(
+        db.and_(DonorProfile.blood_type == blood_type, DonorProfile.last_donation.is_(None)),
+        db.and_(DonorProfile.blood_type == blood_type, DonorProfile.last_donation <= cutoff),
+    ))
+
+def check_in(schedule_ids):
+    """Record that donors turned up; returns how many bookings changed."""
+    from models import DonationSchedule
+    checked_in = db.session.execute(db.update(DonationSchedule).where(
+        DonationSchedule.id.in_(schedule_ids), DonationSchedule.status == 'scheduled',
+    ).values(status='checked_in').returning(
+        DonationSchedule.donor_id, DonationSchedule.scheduled_date,
+    ).execution_options(synchronize_session=False)).all()
+    record_bookings_moved(checked_in, 'scheduled', 'checked_in')
+    db.session.commit()
+    return len(checked_in)
+
+def close_past_schedules(today=None):
+    """Settle every booking dated before ``today`` in one transaction.
+
+    Checked-in bookings become 'completed', their donors' last_donation
+    and total_donations are updated and each donation adds a blood unit to
+    stock; bookings nobody checked in to become 'no_show'. Returns
+    (completed, no_show) counts.
+    """
+    from models import DonationSchedule, DonorProfile
+    cutoff = datetime.combine(today or date.today(), datetime.min.time())
+    attended = db.and_(DonationSchedule.status == 'checked_in', DonationSchedule.scheduled_date < cutoff)
+    donations = db.select(db.func.count()).where(
+        attended, DonationSchedule.donor_id == DonorProfile.user_id).scalar_subquery()
+    latest = db.select(db.func.max(DonationSchedule.scheduled_date)).where(
+        attended, DonationSchedule.donor_id == DonorProfile.user_id).scalar_subquery()
+    db.session.execute(db.update(DonorProfile).where(
+        DonorProfile.user_id.in_(db.select(DonationSchedule.donor_id).where(attended)),
+    ).values(
+        total_donations=db.func.coalesce(DonorProfile.total_donations, 0) + donations,
+        last_donation=db.case(
+            (DonorProfile.last_donation.is_(None), latest),
+            (DonorProfile.last_donation < latest, latest),
+            else_=DonorProfile.last_donation,
+        ),
+    ).execution_options(synchronize_session=False))
+    settled = DonationSchedule.donor_id, DonationSchedule.scheduled_date
+    completed = db.session.execute(db.update(DonationSchedule).where(attended).values(
+        status='completed').returning(DonationSchedule.id, *settled).execution_options(synchronize_session=False)).all()
+    no_show = db.session.execute(db.update(DonationSchedule).where(
+        DonationSchedule.status == 'scheduled', DonationSchedule.scheduled_date < cutoff,
+    ).values(status='no_show').returning(*settled).execution_options(synchronize_session=False)).all()
+    record_bookings_moved([(donor_id, day) for _, donor_id, day in completed], 'checked_in', 'completed')
+    record_bookings_moved(no_show, 'scheduled', 'no_show')
+    collect_donations(completed)
+    db.session.commit()
+    if completed:
+        invalidate_inventory_cache()
+    return len(completed), len(no_show)
+
+@recurring('close_past_schedules', CLOSE_INTERVAL)
+def close_past_schedules_job(ctx):
+    close_past_schedules()
+
+schedules_cli = AppGroup('schedules', help='Donation booking maintenance.')
+
+@schedules_cli.command('close')
+@click.option('--today', type=click.DateTime(formats=['%Y-%m-%d']), help='Settle bookings before this date.')
+def close_command(today):
+    """Mark past bookings completed or no-show and update donor counters."""
+    completed, no_show = close_past_schedules(today.date() if today else None)
+    click.echo(f'{completed} completed, {no_show} no-show.')
@@ -0,0 +1,186 @@
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+
+from app import db
+from geo import geo_cell, load_zip_centroids
+from locations import normalize_location
+from matching import BLOOD_TYPES
+
+# Every generated account uses this password.
+SEED_PASSWORD = 'password123'
+BATCH_SIZE = 10000
+
+# The ZIP codes donors are generated in, with their cities.
+ZIP_PLACES = {
+    '02108': ('Boston', 'MA'), '10001': ('New York', 'NY'), '19103': ('Philadelphia', 'PA'),
+    '20001': ('Washington', 'DC'), '30303': ('Atlanta', 'GA'), '33101': ('Miami', 'FL'),
+    '60601': ('Chicago', 'IL'), '75201': ('Dallas', 'TX'), '77002': ('Houston', 'TX'),
+    '80202': ('Denver', 'CO'), '85004': ('Phoenix', 'AZ'), '90012': ('Los Angeles', 'CA'),
+    '90210': ('Beverly Hills', 'CA'), '94103': ('San Francisco', 'CA'), '98101': ('Seattle', 'WA'),
+}
+# Roughly the US donor population's type distribution.
+TYPE_WEIGHTS = [34, 6, 9, 2, 3, 1, 38, 7]
+HOSPITALS = ['General Hospital', 'St. Mary Medical Center', 'University Hospital', 'Children\'s Hospital',
+             'Memorial Hospital', 'Regional Medical Center']
+MESSAGES = ['Your donation has been scheduled.', 'Thank you for your recent donation!',
+            'Your blood request has been approved.', 'A donor drive is happening near you this weekend.',
+            'Emergency: O- blood is urgently needed at General Hospital.']
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _insert(model, rows, batch_size):
+    count = 0
+    for batch in _batches(rows, batch_size):
+        db.session.execute(model.__table__.insert(), batch)
+        db.session.commit()
+        count += len(batch)
+    return count
+
+def generate(users, seed=0, batch_size=BATCH_SIZE, now=None):
+    """Add ``users`` accounts and their related rows, about six rows per user.
+
+    The same ``users`` and ``seed`` always produce the same data. Rows are
+    appended after any that already exist and written with bulk inserts, so
+    tens of millions of rows are feasible. Returns row counts per table.
+    """
+    from inventory import apply_adjustments
+    from models import BloodRequest, DonationSchedule, DonationSite, DonationSlot, DonorProfile, Notification, User
+    from passwords import hash_password
+    from rollups import rebuild
+
+    rng = random.Random(seed)
+    now = now or datetime(2026, 1, 1)
+    password_hash = hash_password(SEED_PASSWORD)
+    centroids = load_zip_centroids()
+    zip_codes = sorted(zip_code for zip_code in centroids if zip_code in ZIP_PLACES)
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    admins = max(1, users // 1000)
+    recipients = users // 4
+
+    def role(user_id):
+        n = user_id - first_user
+        return 'admin' if n < admins else 'recipient' if n < admins + recipients else 'donor'
+
+    def ago(days):
+        return now - timedelta(days=rng.uniform(0, days))
+
+    user_ids = range(first_user, first_user + users)
+
+    def user_rows():
+        for user_id in user_ids:
+            yield {'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com',
+                   'password_hash': password_hash, 'role': role(user_id), 'created_at': ago(730),
+                   'session_version': 0}
+
+    def donor_rows():
+        for user_id in user_ids:
+            if role(user_id) != 'donor' or rng.random() >= 0.9:
+                continue
+            zip_code = rng.choice(zip_codes)
+            city, state = ZIP_PLACES[zip_code]
+            lat, lon = centroids[zip_code]
+            lat, lon = lat + rng.uniform(-0.3, 0.3), lon + rng.uniform(-0.3, 0.3)
+            yield {'user_id': user_id, 'blood_type': rng.choices(BLOOD_TYPES, TYPE_WEIGHTS)[0],
+                   'last_donation': ago(365) if rng.random() < 0.7 else None,
+                   'medical_conditions': None,
+                   'availability_status': 'available' if rng.random() < 0.85 else 'unavailable',
+                   'total_donations': rng.randint(0, 20), 'address': f'{rng.randint(1, 9999)} Main St',
+                   'city': city, 'state': state, 'zip_code': zip_code,
+                   'city_norm': normalize_location(city), 'state_norm': normalize_location(state),
+                   'latitude': lat, 'longitude': lon, 'geo_cell': geo_cell(lat, lon), 'created_at': ago(730)}
+
+    def request_rows():
+        for user_id in user_ids:
+            if role(user_id) != 'recipient':
+                continue
+            for _ in range(rng.randint(0, 4)):
+                yield {'recipient_id': user_id, 'blood_type': rng.choices(BLOOD_TYPES, TYPE_WEIGHTS)[0],
+                       'quantity_ml': rng.choice([450, 500, 900, 1000]), 'hospital_name': rng.choice(HOSPITALS),
+                       'contact_number': f'555-{rng.randint(0, 9999):04d}', 'emergency': rng.random() < 0.1,
+                       'status': rng.choices(['pending', 'approved', 'completed', 'rejected'], [3, 3, 3, 1])[0],
+                       'notes': None, 'created_at': ago(365)}
+
+    def notification_rows():
+        for user_id in user_ids:
+            for _ in range(rng.randint(0, 6)):
+                yield {'user_id': user_id, 'message': rng.choice(MESSAGES), 'read': rng.random() < 0.6,
+                       'created_at': ago(365)}
+
+    existing_sites = {name for (name,) in db.session.query(DonationSite.name)}
+    db.session.add_all(DonationSite(name=f'{city} Donation Center', city=city, state=state, daily_capacity=50)
+                       for city, state in sorted(set(ZIP_PLACES.values()))
+                       if f'{city} Donation Center' not in existing_sites)
+    db.session.commit()
+    site_ids = [site_id for (site_id,) in db.session.query(DonationSite.id).order_by(DonationSite.id)]
+    bookings = Counter()
+
+    def schedule_rows():
+        for user_id in user_ids:
+            if role(user_id) != 'donor':
+                continue
+            for _ in range(rng.randint(0, 2)):
+                scheduled = datetime.combine(now + timedelta(days=rng.randint(-365, 60)), datetime.min.time())
+                site_id = rng.choice(site_ids)
+                if scheduled > now:
+                    status = 'scheduled'
+                    bookings[site_id, scheduled.date()] += 1
+                else:
+                    status = rng.choice(['completed', 'completed', 'no_show', 'cancelled'])
+                yield {'donor_id': user_id, 'site_id': site_id, 'scheduled_date': scheduled, 'status': status,
+                       'created_at': scheduled - timedelta(days=rng.randint(1, 30))}
+
+    def book_slots():
+        taken = set(db.session.query(DonationSlot.site_id, DonationSlot.day))
+        slots = DonationSlot.__table__
+        existing = [{'slot_site': site_id, 'slot_day': day, 'extra': booked}
+                    for (site_id, day), booked in bookings.items() if (site_id, day) in taken]
+        if existing:
+            db.session.execute(slots.update().where(
+                slots.c.site_id == db.bindparam('slot_site'), slots.c.day == db.bindparam('slot_day'),
+            ).values(booked=slots.c.booked + db.bindparam('extra')), existing)
+        return len(existing) + _insert(DonationSlot, (
+            {'site_id': site_id, 'day': day, 'capacity': max(50, booked), 'booked': booked}
+            for (site_id, day), booked in sorted(bookings.items()) if (site_id, day) not in taken), batch_size)
+
+    counts = {}
+    for name, model, rows in (('users', User, user_rows()), ('donor_profiles', DonorProfile, donor_rows()),
+                              ('blood_requests', BloodRequest, request_rows()),
+                              ('notifications', Notification, notification_rows()),
+                              ('donation_schedules', DonationSchedule, schedule_rows())):
+        counts[name] = _insert(model, rows, batch_size)
+    counts['donation_slots'] = book_slots()
+    apply_adjustments([(blood_type, rng.randint(5, 50) * 450) for blood_type in BLOOD_TYPES], 'seed')
+    counts['inventory_adjustments'] = len(BLOOD_TYPES)
+    # Bulk inserts bypass the incremental rollups.
+    counts['rollups'] = rebuild()
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+    return counts
+
+@click.command('seed')
+@click.option('--users', default=10000, show_default=True, help='Accounts to add; about six rows are made per user.')
+@click.option('--seed', 'seed_value', default=0, show_default=True, help='Random seed.')
+@with_appcontext
+def seed_command(users, seed_value):
+    """Fill the database with reproducible synthetic data."""
+    start = time.perf_counter()
+    counts = generate(users, seed_value)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    for name, count in counts.items():
+        click.echo(f'{name}: {count}')
+    click.echo(f'{total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s). Password: {SEED_PASSWORD}')
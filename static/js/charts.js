@@ -1,7 +1,7 @@
 // Blood inventory visualization
 function initializeInventoryChart(data) {
     const ctx = document.getElementById('inventoryChart').getContext('2d');
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'bar',
         data: {
             labels: Object.keys(data),
@@ -39,10 +39,34 @@ function initializeInventoryChart(data) {
     });
 }
 
+// Keep the inventory chart current. The endpoint answers 304 while stock is
+// unchanged, so polling costs the server almost nothing.
+function pollInventoryChart(chart, url, intervalMs) {
+    let last = JSON.stringify(chart.data.datasets[0].data);
+    setInterval(function() {
+        fetch(url, {credentials: 'same-origin'})
+            .then(response => response.ok ? response.json() : null)
+            .then(function(payload) {
+                if (!payload) {
+                    return;
+                }
+                const values = payload.inventory.map(item => item.quantity_ml);
+                const current = JSON.stringify(values);
+                if (current !== last) {
+                    chart.data.labels = payload.inventory.map(item => item.blood_type);
+                    chart.data.datasets[0].data = values;
+                    chart.update();
+                    last = current;
+                }
+            })
+            .catch(function() {});
+    }, intervalMs || 30000);
+}
+
 // Donation trends visualization
 function initializeTrendsChart(data) {
     const ctx = document.getElementById('trendsChart').getContext('2d');
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'line',
         data: {
             labels: data.labels,
@@ -85,3 +109,11 @@ function initializeTrendsChart(data) {
         }
     });
 }
+
+// Fetch a series from the trends API and draw it.
+function loadTrendsChart(url) {
+    return fetch(url, {credentials: 'same-origin'})
+        .then(response => response.ok ? response.json() : null)
+        .then(payload => payload ? initializeTrendsChart(payload) : null)
+        .catch(function() {});
+}
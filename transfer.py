@@ -0,0 +1,322 @@
+import codecs
+import csv
+import io
+import json
+from datetime import date, datetime
+
+import click
+from flask.cli import AppGroup
+from werkzeug.datastructures import MultiDict
+
+from app import db
+from forms import BloodRequestForm, DonorProfileForm, InventoryUpdateForm
+from geo import geo_cell, geocode_zip
+from inventory import InsufficientInventory, apply_adjustments
+from locations import normalize_location
+from rollups import record_requests
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FALSE_VALUES = ('', '0', 'false', 'no', 'n', 'off')
+AVAILABILITY_STATUSES = ('available', 'unavailable')
+
+class MalformedRow:
+    """Stands in for an input row that could not be parsed at all."""
+
+    def __init__(self, error):
+        self.error = error
+
+def read_csv(stream):
+    """Yield rows from a binary or text CSV stream without buffering it."""
+    if not isinstance(stream, io.TextIOBase):
+        # Request bodies (werkzeug's or gunicorn's) iterate as byte lines but
+        # are not all full io objects, so decode the lines rather than wrap.
+        stream = codecs.iterdecode(stream, 'utf-8')
+    yield from csv.DictReader(stream)
+
+def read_ndjson(stream):
+    """Yield one dict per non-blank line; unparseable lines yield a MalformedRow."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield MalformedRow(f'invalid JSON: {e}')
+            continue
+        yield row if isinstance(row, dict) else MalformedRow('not a JSON object')
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _formdata(row):
+    return MultiDict({key: '' if value is None else str(value) for key, value in row.items() if key})
+
+def _validate(form, row):
+    form.process(_formdata(row))
+    if form.validate():
+        return None
+    return '; '.join(f'{field}: {", ".join(errors)}' for field, errors in form.errors.items())
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line, 'error': message})
+
+    def as_dict(self):
+        return {'imported': self.imported, 'rejected': self.rejected, 'errors': self.errors}
+
+def _user_ids(rows, id_key, email_key):
+    """Resolve each row's user by id or email with one query per chunk."""
+    from models import User
+    emails = {str(row[email_key]).strip().lower() for row in rows if not row.get(id_key) and row.get(email_key)}
+    by_email = {}
+    if emails:
+        by_email = {email.lower(): user_id for email, user_id in
+                    db.session.query(User.email, User.id).filter(db.func.lower(User.email).in_(emails))}
+    ids = []
+    for row in rows:
+        if row.get(id_key):
+            try:
+                ids.append(int(row[id_key]))
+            except (TypeError, ValueError):
+                ids.append(None)
+        else:
+            ids.append(by_email.get(str(row.get(email_key) or '').strip().lower()))
+    return ids
+
+def _import_donors(chunk, lines, result, form):
+    from models import DonorProfile, User
+    del form['agree_to_terms']
+    user_ids = _user_ids(chunk, 'user_id', 'email')
+    roles = dict(db.session.query(User.id, User.role).filter(User.id.in_([i for i in user_ids if i])))
+    known = {user_id for user_id, role in roles.items() if role == 'donor'}
+    taken = {user_id for (user_id,) in db.session.query(DonorProfile.user_id).filter(DonorProfile.user_id.in_(known))}
+    now = datetime.utcnow()
+    rows = []
+    for offset, (row, user_id) in enumerate(zip(chunk, user_ids)):
+        line = lines[offset]
+        if user_id not in roles:
+            result.reject(line, 'unknown user')
+            continue
+        if user_id not in known:
+            result.reject(line, 'user is not a donor')
+            continue
+        if user_id in taken:
+            result.reject(line, 'user already has a donor profile')
+            continue
+        if row.get('last_donation'):
+            row = dict(row, last_donation=str(row['last_donation'])[:10])
+        error = _validate(form, row)
+        if error:
+            result.reject(line, error)
+            continue
+        availability_status = row.get('availability_status') or 'available'
+        if availability_status not in AVAILABILITY_STATUSES:
+            result.reject(line, f'availability_status: unknown status {availability_status!r}')
+            continue
+        try:
+            total_donations = int(row.get('total_donations') or 0)
+        except (TypeError, ValueError):
+            total_donations = -1
+        if total_donations < 0:
+            result.reject(line, 'total_donations: must be a whole number of zero or more')
+            continue
+        coordinates = geocode_zip(form.zip_code.data)
+        last_donation = form.last_donation.data
+        rows.append({
+            'user_id': user_id,
+            'blood_type': form.blood_type.data,
+            'last_donation': datetime.combine(last_donation, datetime.min.time()) if last_donation else None,
+            'medical_conditions': form.medical_conditions.data,
+            'availability_status': availability_status,
+            'total_donations': total_donations,
+            'address': form.address.data,
+            'city': form.city.data,
+            'state': form.state.data,
+            'zip_code': form.zip_code.data,
+            'city_norm': normalize_location(form.city.data),
+            'state_norm': normalize_location(form.state.data),
+            'latitude': coordinates[0] if coordinates else None,
+            'longitude': coordinates[1] if coordinates else None,
+            'geo_cell': geo_cell(*coordinates) if coordinates else None,
+            'created_at': now,
+        })
+        taken.add(user_id)
+    if rows:
+        db.session.execute(DonorProfile.__table__.insert(), rows)
+        db.session.commit()
+    result.imported += len(rows)
+
+def _import_requests(chunk, lines, result, form):
+    from models import BloodRequest, User
+    recipient_ids = _user_ids(chunk, 'recipient_id', 'recipient_email')
+    known = {user_id for (user_id,) in db.session.query(User.id).filter(
+        User.id.in_([i for i in recipient_ids if i]), User.role == 'recipient')}
+    now = datetime.utcnow()
+    rows = []
+    for offset, (row, recipient_id) in enumerate(zip(chunk, recipient_ids)):
+        line = lines[offset]
+        if recipient_id not in known:
+            result.reject(line, 'unknown recipient')
+            continue
+        if str(row.get('emergency', '')).strip().lower() in FALSE_VALUES:
+            row = {key: value for key, value in row.items() if key != 'emergency'}
+        error = _validate(form, row)
+        if error:
+            result.reject(line, error)
+            continue
+        status = row.get('status') or 'pending'
+        if status not in ('pending', 'approved', 'completed', 'rejected'):
+            result.reject(line, f'status: unknown status {status!r}')
+            continue
+        rows.append({
+            'recipient_id': recipient_id,
+            'blood_type': form.blood_type.data,
+            'quantity_ml': form.quantity_ml.data,
+            'hospital_name': form.hospital_name.data,
+            'contact_number': form.contact_number.data,
+            'emergency': form.emergency.data,
+            'status': status,
+            'notes': form.notes.data,
+            'created_at': now,
+        })
+    if rows:
+        db.session.execute(BloodRequest.__table__.insert(), rows)
+        record_requests(rows)
+        db.session.commit()
+    result.imported += len(rows)
+
+def _import_inventory(chunk, lines, result, form):
+    adjustments = []
+    for offset, row in enumerate(chunk):
+        error = _validate(form, row)
+        if error or form.quantity_ml.data <= 0:
+            result.reject(lines[offset], error or 'quantity_ml: must be positive')
+            continue
+        quantity = form.quantity_ml.data
+        adjustments.append((lines[offset], form.blood_type.data,
+                            quantity if form.operation.data == 'add' else -quantity))
+    try:
+        apply_adjustments([(blood_type, delta) for _, blood_type, delta in adjustments], 'import')
+        result.imported += len(adjustments)
+    except InsufficientInventory:
+        # Find the offending rows; everything else in the chunk still applies.
+        for line, blood_type, delta in adjustments:
+            try:
+                apply_adjustments([(blood_type, delta)], 'import')
+                result.imported += 1
+            except InsufficientInventory as e:
+                result.reject(line, str(e))
+
+IMPORTERS = {
+    'donors': (_import_donors, DonorProfileForm),
+    'requests': (_import_requests, BloodRequestForm),
+    'inventory': (_import_inventory, InventoryUpdateForm),
+}
+
+def import_rows(entity, rows, chunk_size=CHUNK_SIZE):
+    """Validate and insert ``rows`` (an iterable of dicts) chunk by chunk.
+
+    Rows are checked with the same form rules as the web UI; MalformedRow
+    entries are rejected without stopping the import. Memory use is bounded
+    by ``chunk_size`` whatever the length of the input.
+    """
+    importer, form_class = IMPORTERS[entity]
+    result = ImportResult()
+    line = 1
+    for chunk in _chunks(rows, chunk_size):
+        parsed, lines = [], []
+        for offset, row in enumerate(chunk):
+            if isinstance(row, MalformedRow):
+                result.reject(line + offset, row.error)
+            else:
+                parsed.append(row)
+                lines.append(line + offset)
+        if parsed:
+            importer(parsed, lines, result, form_class(formdata=None, meta={'csrf': False}))
+        line += len(chunk)
+    return result
+
+def _export_columns(entity):
+    from models import BloodInventory, BloodRequest, DonationSchedule, DonorProfile
+    model = {
+        'donors': DonorProfile,
+        'requests': BloodRequest,
+        'schedules': DonationSchedule,
+        'inventory': BloodInventory,
+    }[entity]
+    columns = [column for column in model.__table__.columns
+               if column.name not in ('city_norm', 'state_norm', 'geo_cell')]
+    return model, columns
+
+EXPORTABLE = ('donors', 'requests', 'schedules', 'inventory')
+
+def export_rows(entity, chunk_size=CHUNK_SIZE):
+    """Yield every row of ``entity`` as a dict, fetching ``chunk_size`` at a time."""
+    model, columns = _export_columns(entity)
+    statement = db.select(*columns).order_by(model.__table__.c.id).execution_options(yield_per=chunk_size)
+    for row in db.session.execute(statement):
+        yield row._asdict()
+
+def _text(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def export_csv(entity, chunk_size=CHUNK_SIZE):
+    _, columns = _export_columns(entity)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in columns])
+    for count, row in enumerate(export_rows(entity, chunk_size), 1):
+        writer.writerow([_text(value) for value in row.values()])
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def export_ndjson(entity, chunk_size=CHUNK_SIZE):
+    lines = []
+    for row in export_rows(entity, chunk_size):
+        lines.append(json.dumps({key: _text(value) for key, value in row.items()}))
+        if len(lines) >= chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+data_cli = AppGroup('data', help='Bulk import and export.')
+
+@data_cli.command('import')
+@click.argument('entity', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--ndjson', is_flag=True, help='Read newline-delimited JSON instead of CSV.')
+def import_command(entity, source, ndjson):
+    result = import_rows(entity, read_ndjson(source) if ndjson else read_csv(source))
+    for error in result.errors:
+        click.echo(f"row {error['row']}: {error['error']}", err=True)
+    click.echo(f'Imported {result.imported} {entity}, rejected {result.rejected}.')
+
+@data_cli.command('export')
+@click.argument('entity', type=click.Choice(EXPORTABLE))
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--ndjson', is_flag=True, help='Write newline-delimited JSON instead of CSV.')
+def export_command(entity, target, ndjson):
+    for chunk in (export_ndjson(entity) if ndjson else export_csv(entity)):
+        target.write(chunk)
@@ -0,0 +1,127 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import joinedload
+
+from app import db
+from inventory import current_inventory, invalidate_inventory_cache
+from matching import compatible_donor_types
+from notifications import notify_many
+from rollups import record_requests_moved
+from units import allocate_units
+
+TRIAGE_ACTIONS = {'approve': 'approved', 'reject': 'rejected'}
+MAX_TRIAGE_BATCH = 500
+TRIAGE_QUEUE_LIMIT = 50
+# Requests that arrived within the same window count as equally old, and the
+# ones whose blood type is scarcest go first.
+AGE_BUCKET = timedelta(minutes=15)
+
+QueueEntry = namedtuple('QueueEntry', ['request', 'compatible_stock_ml'])
+TriageResult = namedtuple('TriageResult', ['approved', 'rejected', 'skipped', 'allocations'])
+
+class ReservationShortfall(Exception):
+    def __init__(self, request_id, shortfall_ml):
+        super().__init__(f'Not enough blood units to reserve request {request_id}: {shortfall_ml}ml short.')
+        self.request_id = request_id
+        self.shortfall_ml = shortfall_ml
+
+def decision_message(blood_request, status):
+    return (f'Your blood request for {blood_request.quantity_ml}ml of {blood_request.blood_type} '
+            f'has been {status}.')
+
+def _compatible_stock():
+    stock = {item.blood_type: item.quantity_ml for item in current_inventory().items}
+    return lambda blood_type: sum(stock.get(donor_type, 0) for donor_type in compatible_donor_types(blood_type))
+
+def triage_queue(limit=TRIAGE_QUEUE_LIMIT):
+    """The next ``limit`` pending requests to triage, most urgent first.
+
+    Emergencies come first, then the oldest; requests in the same AGE_BUCKET
+    are ordered by how much compatible stock is left, least first. Reads at
+    most ``2 * limit`` rows however long the backlog is.
+    """
+    from models import BloodRequest
+    # One LIMITed walk of ix_blood_request_status_emergency_created per
+    # emergency value, combined into a single statement.
+    branches = [
+        db.select(BloodRequest.id).where(
+            BloodRequest.status == 'pending', BloodRequest.emergency.is_(emergency),
+        ).order_by(BloodRequest.created_at, BloodRequest.id).limit(limit).subquery()
+        for emergency in (True, False)
+    ]
+    ids = db.union_all(*[db.select(branch.c.id) for branch in branches])
+    blood_requests = BloodRequest.query.options(joinedload(BloodRequest.recipient)).filter(
+        BloodRequest.id.in_(ids)).all()
+
+    stock_for = _compatible_stock()
+    bucket = AGE_BUCKET.total_seconds()
+    entries = [QueueEntry(blood_request, stock_for(blood_request.blood_type)) for blood_request in blood_requests]
+    entries.sort(key=lambda entry: (
+        not entry.request.emergency,
+        (entry.request.created_at - datetime.min).total_seconds() // bucket,
+        entry.compatible_stock_ml,
+        entry.request.created_at,
+        entry.request.id,
+    ))
+    return entries[:limit]
+
+def decide_requests(ids, status):
+    """Move the requests among ``ids`` that are still pending to ``status``.
+
+    A single conditional UPDATE in the current transaction, so a request
+    decided by someone else meanwhile is left alone rather than decided
+    twice. Returns the rows it moved; the caller notifies and commits.
+    """
+    from models import BloodRequest
+    rows = db.session.execute(db.update(BloodRequest).where(
+        BloodRequest.id.in_(ids), BloodRequest.status == 'pending',
+    ).values(status=status).returning(
+        BloodRequest.id, BloodRequest.recipient_id, BloodRequest.blood_type, BloodRequest.quantity_ml,
+        BloodRequest.emergency, BloodRequest.created_at,
+    ).execution_options(synchronize_session=False)).all()
+    record_requests_moved([(row.created_at, row.blood_type, row.quantity_ml) for row in rows], 'pending', status)
+    return rows
+
+def triage(decisions, user_id=None, reserve=False, now=None):
+    """Approve and reject many pending requests in one transaction.
+
+    ``decisions`` maps request ids to 'approve' or 'reject'. Requests no
+    longer pending (decided by someone else meanwhile, or missing) are
+    skipped. Recipients are notified with one bulk INSERT.
+
+    With ``reserve``, every approved request is covered with blood units,
+    emergencies and oldest first, in the same transaction, or nothing is
+    decided: ReservationShortfall (or InsufficientInventory) rolls the whole
+    batch back. Only stock tracked as units can be reserved; millilitres
+    added by hand or by a bulk adjustment have no units behind them.
+    """
+    decided, messages, allocations = {}, [], []
+    try:
+        for action, status in TRIAGE_ACTIONS.items():
+            ids = [request_id for request_id, chosen in decisions.items() if chosen == action]
+            if not ids:
+                continue
+            rows = decided[status] = decide_requests(ids, status)
+            messages += [(row.recipient_id, decision_message(row, status)) for row in rows]
+        if reserve:
+            approved = sorted(decided.get('approved', []), key=lambda row: (not row.emergency, row.created_at, row.id))
+            for row in approved:
+                allocation = allocate_units(row, user_id, now)
+                if allocation.shortfall_ml:
+                    raise ReservationShortfall(row.id, allocation.shortfall_ml)
+                allocations.append((row.id, allocation))
+        notify_many(messages)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if allocations:
+        invalidate_inventory_cache()
+    done = {row.id for rows in decided.values() for row in rows}
+    return TriageResult(
+        sorted(row.id for row in decided.get('approved', [])),
+        sorted(row.id for row in decided.get('rejected', [])),
+        sorted(set(decisions) - done),
+        allocations,
+    )
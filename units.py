@@ -0,0 +1,180 @@
+import math
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+
+from app import db
+from inventory import invalidate_inventory_cache, stage_adjustments
+from jobs import recurring
+from matching import BLOOD_TYPES, compatible_donor_types
+from rollups import donor_blood_types
+
+# Red cells keep about 42 days; a whole-blood donation is about 450ml.
+SHELF_LIFE = timedelta(days=42)
+UNIT_VOLUME_ML = 450
+# The admin dashboard warns about units expiring within this window.
+EXPIRY_WARNING = timedelta(days=7)
+EXPIRY_SWEEP_INTERVAL = timedelta(hours=1)
+INSERT_BATCH = 1000
+
+Allocation = namedtuple('Allocation', ['units', 'allocated_ml', 'shortfall_ml'])
+
+def add_units(units, reason, now=None):
+    """Stage new units from ``(blood_type, collected_at, volume_ml, donation_id)`` tuples.
+
+    Units that are already past their shelf life are recorded as expired;
+    the rest are added to stock in the current transaction. Returns how many
+    units went into stock.
+    """
+    from models import BloodUnit
+    now = now or datetime.utcnow()
+    rows, stocked = [], {}
+    for blood_type, collected_at, volume_ml, donation_id in units:
+        expires_at = collected_at + SHELF_LIFE
+        status = 'available' if expires_at > now else 'expired'
+        rows.append({'blood_type': blood_type, 'volume_ml': volume_ml, 'donation_id': donation_id,
+                     'collected_at': collected_at, 'expires_at': expires_at, 'status': status, 'created_at': now})
+        if status == 'available':
+            stocked[blood_type] = stocked.get(blood_type, 0) + volume_ml
+    for i in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(BloodUnit.__table__.insert(), rows[i:i + INSERT_BATCH])
+    if stocked:
+        stage_adjustments(sorted(stocked.items()), reason)
+    return sum(1 for row in rows if row['status'] == 'available')
+
+def collect_donations(donations, now=None):
+    """Stage one unit per completed ``(schedule_id, donor_id, scheduled_date)`` donation."""
+    types = donor_blood_types(db.session.connection(), [donor_id for _, donor_id, _ in donations])
+    return add_units([(types[donor_id], scheduled_date, UNIT_VOLUME_ML, schedule_id)
+                      for schedule_id, donor_id, scheduled_date in donations if types.get(donor_id)],
+                     'donation', now)
+
+def receive_units(blood_type, count, collected_at, volume_ml=UNIT_VOLUME_ML):
+    """Book ``count`` units collected elsewhere into stock and commit."""
+    try:
+        added = add_units([(blood_type, collected_at, volume_ml, None)] * count, 'received')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_inventory_cache()
+    return added
+
+def _usable(blood_type, now):
+    from models import BloodUnit
+    return db.and_(BloodUnit.blood_type == blood_type, BloodUnit.status == 'available', BloodUnit.expires_at > now)
+
+def _stocked_types(blood_types, now):
+    from models import BloodUnit
+    # One LIMIT 1 probe of ix_blood_unit_type_status_expires per type.
+    probes = [db.select(BloodUnit.blood_type).where(_usable(blood_type, now)).limit(1).subquery()
+              for blood_type in blood_types]
+    return set(db.session.execute(db.union_all(*[db.select(probe.c.blood_type) for probe in probes])).scalars())
+
+def _claim(blood_type, count, request_id, now):
+    from models import BloodUnit
+    # The first-expiring units come straight off the index; the status check
+    # in the UPDATE itself means two allocators never claim the same unit.
+    candidates = db.select(BloodUnit.id).where(_usable(blood_type, now)).order_by(
+        BloodUnit.expires_at, BloodUnit.id).limit(count)
+    return db.session.execute(db.update(BloodUnit).where(
+        BloodUnit.id.in_(candidates), BloodUnit.status == 'available',
+    ).values(status='allocated', request_id=request_id, allocated_at=now).returning(
+        BloodUnit.id, BloodUnit.volume_ml,
+    ).execution_options(synchronize_session=False)).all()
+
+def allocate_units(blood_request, user_id=None, now=None):
+    """Claim units for ``blood_request``, first expiring first out.
+
+    Compatible types are tried in compatible_donor_types order, so the exact
+    type is used before universal donor stock. Claimed units leave stock in
+    the current transaction; the caller commits and then calls
+    invalidate_inventory_cache. Units are whole, so more than was asked for
+    may be allocated. Raises InsufficientInventory if stock was removed by
+    hand below what the units account for.
+    """
+    now = now or datetime.utcnow()
+    donor_types = compatible_donor_types(blood_request.blood_type)
+    stocked = _stocked_types(donor_types, now)
+    still_needed = blood_request.quantity_ml
+    units, totals = [], {}
+    for blood_type in donor_types:
+        while still_needed > 0 and blood_type in stocked:
+            claimed = _claim(blood_type, math.ceil(still_needed / UNIT_VOLUME_ML), blood_request.id, now)
+            if not claimed:
+                break
+            for unit_id, volume_ml in claimed:
+                units.append((blood_type, unit_id, volume_ml))
+                totals[blood_type] = totals.get(blood_type, 0) + volume_ml
+                still_needed -= volume_ml
+    if totals:
+        stage_adjustments([(blood_type, -volume_ml) for blood_type, volume_ml in totals.items()],
+                          'allocated', user_id)
+    return Allocation(units, sum(totals.values()), max(still_needed, 0))
+
+def expire_units(now=None):
+    """Retire every available unit past its expiry, one UPDATE per blood type.
+
+    Returns ``{blood_type: (units, ml)}`` for the types that had expired stock.
+    """
+    from models import BloodInventory, BloodUnit
+    now = now or datetime.utcnow()
+    expired = {}
+    try:
+        for blood_type in BLOOD_TYPES:
+            volumes = db.session.execute(db.update(BloodUnit).where(
+                BloodUnit.blood_type == blood_type, BloodUnit.status == 'available', BloodUnit.expires_at <= now,
+            ).values(status='expired').returning(BloodUnit.volume_ml).execution_options(
+                synchronize_session=False)).scalars().all()
+            if volumes:
+                expired[blood_type] = (len(volumes), sum(volumes))
+        if expired:
+            balances = dict(db.session.query(BloodInventory.blood_type, BloodInventory.quantity_ml).filter(
+                BloodInventory.blood_type.in_(expired)))
+            # Stock removed by hand may already have taken some of these units.
+            adjustments = [(blood_type, -min(volume_ml, balances.get(blood_type) or 0))
+                           for blood_type, (_, volume_ml) in expired.items()]
+            stage_adjustments([adjustment for adjustment in adjustments if adjustment[1]], 'expired')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if expired:
+        invalidate_inventory_cache()
+    return expired
+
+def expiring_soon(now=None, within=EXPIRY_WARNING):
+    """``{blood_type: (units, ml)}`` of available stock expiring within ``within``."""
+    from models import BloodUnit
+    now = now or datetime.utcnow()
+    rows = db.session.query(BloodUnit.blood_type, db.func.count(), db.func.sum(BloodUnit.volume_ml)).filter(
+        BloodUnit.blood_type.in_(BLOOD_TYPES), BloodUnit.status == 'available',
+        BloodUnit.expires_at > now, BloodUnit.expires_at <= now + within,
+    ).group_by(BloodUnit.blood_type)
+    return {blood_type: (count, volume_ml) for blood_type, count, volume_ml in rows}
+
+@recurring('expire_units', EXPIRY_SWEEP_INTERVAL)
+def expire_units_job(ctx):
+    expire_units()
+
+units_cli = AppGroup('units', help='Blood unit stock and expiry.')
+
+@units_cli.command('expire')
+def expire_command():
+    """Retire units past their expiry date now; job workers also do it hourly."""
+    expired = expire_units()
+    for blood_type, (count, volume_ml) in expired.items():
+        click.echo(f'{blood_type}: {count} units ({volume_ml}ml) expired')
+    click.echo(f'{sum(count for count, _ in expired.values())} units expired.')
+
+@units_cli.command('receive')
+@click.argument('blood_type', type=click.Choice(BLOOD_TYPES))
+@click.argument('count', type=int)
+@click.option('--collected', type=click.DateTime(formats=['%Y-%m-%d']), help='Collection date; defaults to now.')
+@click.option('--volume', default=UNIT_VOLUME_ML, show_default=True, help='Volume per unit in ml.')
+def receive_command(blood_type, count, collected, volume):
+    """Book units collected elsewhere into stock."""
+    added = receive_units(blood_type, count, collected or datetime.utcnow(), volume)
+    click.echo(f'{added} {blood_type} units added to stock.')